@@ -0,0 +1,196 @@
+"""
+Incremental accumulators of board features
+
+The evaluation features (see utils.featureRow()) sum the attack and cost
+of the minions of both fields. While tracking is on, attribute writes
+(zone and controller changes, buffs and aura buffs, stat changes, ...)
+mark the entity they concern as dirty, and the next read only refreshes
+the contributions of the dirty entities, so that reading the totals of a
+freshly modified state costs O(1) per change instead of a pass over both
+fields. Hand and field sizes, hero health and mana are plain attributes,
+which are read directly.
+As with zobrist.py, the totals are stored on the game itself, so they are
+journaled, rolled back and cloned along with the state.
+NOTE: Minions whose stats are computed by scripts or by aura buffs can
+change without being written to; they are refreshed on every read.
+"""
+from hearthstone.enums import CardType, Zone
+from . import journal
+
+
+# Bookkeeping attributes, which do not change any stats
+IGNORED_ATTRIBUTES = {
+	"_zobrist", "_zobrist_generation", "play_counter", "tick", "turn_start", "uuid",
+}
+
+# Number of start() calls not yet matched by stop()
+_depth = 0
+# Bumped by stop(): totals stored by an earlier generation are stale
+_generation = 0
+# The buff classes _observe() looks for, imported by start(): card.py
+# imports utils.py, which imports this module
+_buff_classes = None
+
+
+def _set(obj, name, value):
+	if journal.active is not None:
+		journal.active.record_attr(obj, name)
+	obj.__dict__[name] = value
+
+
+def _mark(entity):
+	if entity is None:
+		return
+	game = getattr(entity, "game", None)
+	if game is None:
+		return
+	d = game.__dict__
+	if d.get("_accumulator_generation") != _generation:
+		return
+	dirty = d["_accumulator_dirty"]
+	if journal.active is not None:
+		journal.active.record_list(dirty)
+	list.append(dirty, entity)
+
+
+def _observe(obj, name, old):
+	if name in IGNORED_ATTRIBUTES:
+		return
+	aura_buff, enchantment = _buff_classes
+	if isinstance(obj, aura_buff):
+		_mark(obj.__dict__.get("entity"))
+	elif isinstance(obj, enchantment):
+		if name == "owner" and old is not journal.MISSING:
+			_mark(old)
+		_mark(obj.__dict__.get("owner"))
+	elif "entity_id" in obj.__dict__:
+		_mark(obj)
+
+
+def _volatile(minion):
+	"""
+	Returns whether the stats of \a minion can change without a write to it
+	or to one of its buffs.
+	"""
+	if minion.slots:
+		return True
+	for entity in [minion] + list(minion.buffs):
+		scripts = entity.data.scripts
+		if hasattr(scripts, "atk") or hasattr(scripts, "cost"):
+			return True
+	return False
+
+
+def _contribution(entity):
+	"""
+	Returns the (generation, player index, atk, cost) \a entity adds to the
+	totals, or None.
+	"""
+	if getattr(entity, "zone", None) != Zone.PLAY or getattr(entity, "type", None) != CardType.MINION:
+		return None
+	index = entity.game.players.index(entity.controller)
+	return (_generation, index, entity.atk, entity.cost)
+
+
+def _reset(game):
+	totals = [0, 0, 0, 0]
+	volatile = []
+	for index, player in enumerate(game.players):
+		for minion in player.field:
+			contribution = _contribution(minion)
+			_set(minion, "_accumulated", contribution)
+			totals[2 * index] += contribution[2]
+			totals[2 * index + 1] += contribution[3]
+			if _volatile(minion):
+				volatile.append(minion)
+	_set(game, "_accumulator_totals", tuple(totals))
+	_set(game, "_accumulator_dirty", [])
+	_set(game, "_accumulator_volatile", volatile)
+	_set(game, "_accumulator_generation", _generation)
+
+
+def _refresh(game):
+	d = game.__dict__
+	entities = d["_accumulator_dirty"] + d["_accumulator_volatile"]
+	totals = list(d["_accumulator_totals"])
+	volatile = []
+	seen = set()
+	for entity in entities:
+		if id(entity) in seen:
+			continue
+		seen.add(id(entity))
+		old = entity.__dict__.get("_accumulated")
+		new = _contribution(entity)
+		if old == new:
+			if new is not None and _volatile(entity):
+				volatile.append(entity)
+			continue
+		if old is not None and old[0] == _generation:
+			totals[2 * old[1]] -= old[2]
+			totals[2 * old[1] + 1] -= old[3]
+		if new is not None:
+			totals[2 * new[1]] += new[2]
+			totals[2 * new[1] + 1] += new[3]
+			if _volatile(entity):
+				volatile.append(entity)
+		_set(entity, "_accumulated", new)
+	_set(game, "_accumulator_totals", tuple(totals))
+	_set(game, "_accumulator_dirty", [])
+	_set(game, "_accumulator_volatile", volatile)
+
+
+def compute(player):
+	"""
+	Returns the (atk, cost) totals of the field of \a player, computed from
+	scratch.
+	"""
+	return (
+		sum(minion.atk for minion in player.field),
+		sum(minion.cost for minion in player.field),
+	)
+
+
+def field_totals(player):
+	"""
+	Returns the (atk, cost) totals of the field of \a player. They are
+	computed from scratch the first time and then maintained incrementally
+	until stop().
+	"""
+	if not _depth:
+		return compute(player)
+	game = player.game
+	d = game.__dict__
+	if d.get("_accumulator_generation") != _generation:
+		_reset(game)
+	elif d["_accumulator_dirty"] or d["_accumulator_volatile"]:
+		_refresh(game)
+	totals = d["_accumulator_totals"]
+	index = game.players.index(player)
+	return totals[2 * index], totals[2 * index + 1]
+
+
+def start():
+	"""
+	Start tracking attribute writes (if not already), so that the totals
+	returned by field_totals() are kept up to date. Every start() must be
+	matched by a stop().
+	"""
+	global _buff_classes, _depth
+	if not _depth:
+		from .aura import AuraBuff
+		from .card import Enchantment
+		_buff_classes = (AuraBuff, Enchantment)
+		journal.add_observer(_observe)
+	_depth += 1
+
+
+def stop():
+	"""
+	Release a start(). Once tracking stops, stored totals become stale and
+	are recomputed by the next field_totals().
+	"""
+	global _depth, _generation
+	_depth -= 1
+	if not _depth:
+		journal.remove_observer(_observe)
+		_generation += 1
@@ -1,6 +1,7 @@
 from collections import OrderedDict
 from inspect import isclass
 from hearthstone.enums import BlockType, CardType, CardClass, Mulligan, PlayState, Step, Zone
+from . import chance
 from .dsl import LazyNum, LazyValue, Selector
 from .entity import Entity
 from .logging import log
@@ -790,7 +791,9 @@ class Draw(TargetedAction):
 	CARD = CardArg()
 
 	def get_target_args(self, source, target):
-		if target.deck:
+		if target.deck and chance.handler is not None:
+			card = chance.pick("DRAW", target.deck, key=lambda card: card.id)
+		elif target.deck:
 			card = target.deck[-1]
 		else:
 			card = None
@@ -1,8 +1,9 @@
+from .journal import Journaled
 from .logging import log
 from .managers import CardManager
 
 
-class AuraBuff:
+class AuraBuff(Journaled):
 	def __init__(self, source, entity):
 		self.source = source
 		self.entity = entity
@@ -65,6 +65,7 @@ def princeWarlock():
 class BaseCard(BaseEntity):
 	Manager = CardManager
 	delayed_destruction = False
+	shared_attributes = ("data", "entourage", "requirements")
 
 	def __init__(self, data):
 		self.created = False
@@ -797,7 +798,7 @@ class Enchantment(BaseCard):
 
 	def __init__(self, data):
 		self.one_turn_effect = False
-		self.additional_deathrattles = []
+		self.additional_deathrattles = CardList()
 		super().__init__(data)
 
 	@property
@@ -0,0 +1,131 @@
+"""
+Chance events: the random outcomes of the rules
+
+Random effects (RANDOM selectors, RandomNumber, random card generation
+and draws) draw from the global random module by default. While a
+handler is set, each of them is described instead as a ChanceEvent
+listing its possible outcomes with their probabilities, and the handler
+picks the one that happens. Searches can then enumerate the outcomes of
+a move (expectimax) or branch on a few sampled ones (see outcomes()).
+NOTE: Draws are chance events over the cards left in the deck, so the
+order of the deck (and shuffles) does not matter while a handler is set.
+As with the journal, there is a single handler per process.
+"""
+import random
+from collections import Counter, namedtuple
+
+
+# kind is one of "RANDOM" (entities picked by a RANDOM selector), "NUMBER",
+# "CARD" (card ids generated) and "DRAW" (cards drawn from the deck);
+# probabilities are those of each of the outcomes, in the same order
+ChanceEvent = namedtuple("ChanceEvent", ("kind", "outcomes", "probabilities"))
+
+# Called as handler(event) for every chance event while set, and returns
+# the index of the outcome which happens
+handler = None
+
+
+def set_handler(func):
+	"""
+	Set (or clear, if None) the chance event handler and return the previous one.
+	"""
+	global handler
+	ret = handler
+	handler = func
+	return ret
+
+
+def pick(kind, outcomes, weights=None, key=None):
+	"""
+	Return the outcome the handler picks among \a outcomes, with
+	probabilities proportional to \a weights (uniform if None).
+	If \a key is given, outcomes with the same key are merged into the
+	first of them, as they lead to the same states.
+	"""
+	if weights is None:
+		weights = [1] * len(outcomes)
+	if key is not None:
+		merged = {}
+		for outcome, weight in zip(outcomes, weights):
+			k = key(outcome)
+			if k in merged:
+				merged[k][1] += weight
+			else:
+				merged[k] = [outcome, weight]
+		outcomes = [outcome for outcome, weight in merged.values()]
+		weights = [weight for outcome, weight in merged.values()]
+	total = sum(weights)
+	event = ChanceEvent(kind, tuple(outcomes), tuple(weight / total for weight in weights))
+	return event.outcomes[handler(event)]
+
+
+def sample(event, count):
+	"""
+	Return \a count outcome indices of \a event drawn at random (with
+	replacement), as (index, probability) pairs with duplicates merged.
+	"""
+	indices = random.choices(range(len(event.outcomes)), event.probabilities, k=count)
+	return [(index, n / count) for index, n in Counter(indices).items()]
+
+
+class _Branching:
+	"""
+	A handler following the outcome branches in \a path, and taking
+	the first branch of the chance events past its end.
+	"""
+	def __init__(self, branches, path, samples):
+		self.branches = branches
+		self.path = path
+		self.samples = samples
+		self.depth = 0
+		self.probability = 1.
+
+	def __call__(self, event):
+		prefix = tuple(self.path[:self.depth])
+		options = self.branches.get(prefix)
+		if options is None:
+			if self.samples is not None and len(event.outcomes) > self.samples:
+				options = sample(event, self.samples)
+			else:
+				options = [(i, p) for i, p in enumerate(event.probabilities) if p > 0]
+			self.branches[prefix] = options
+		if self.depth == len(self.path):
+			self.path.append(0)
+		index, probability = options[self.path[self.depth]]
+		self.depth += 1
+		self.probability *= probability
+		return index
+
+
+def outcomes(game, func, samples=None):
+	"""
+	Call func() once per combination of the outcomes of the chance events
+	it meets, rolling \a game back after each call, and return a list of
+	(probability, result) pairs. Chance events with more than \a samples
+	outcomes only branch on that many, drawn at random (sparse sampling),
+	so that the expected value of a result can be estimated cheaply.
+	NOTE: func() must meet the same chance events every time it follows
+	the same outcomes (eg. by seeding the random module beforehand).
+	"""
+	ret = []
+	branches = {}
+	path = []
+	while True:
+		branching = _Branching(branches, path, samples)
+		previous = set_handler(branching)
+		mark = game.mark()
+		try:
+			result = func()
+		finally:
+			game.rollback(mark)
+			set_handler(previous)
+		ret.append((branching.probability, result))
+		# Move on to the next branch of the deepest chance event met
+		del path[branching.depth:]
+		while path:
+			path[-1] += 1
+			if path[-1] < len(branches[tuple(path[:-1])]):
+				break
+			path.pop()
+		if not path:
+			return ret
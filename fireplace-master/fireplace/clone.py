@@ -0,0 +1,135 @@
+"""
+Fast structural copies of game states
+"""
+from types import MethodType
+from uuid import UUID
+from .actions import Action
+from .aura import AuraBuff
+from .entity import BaseEntity
+from .managers import Manager
+
+
+# Values of these types are immutable and can be shared between games
+ATOMIC_TYPES = (type(None), bool, int, float, str, UUID)
+
+
+class Cloner:
+	"""
+	Copy the per-game state reachable from an entity in a single pass.
+	Entities, aura buffs, managers, pending actions and containers are
+	copied and every cross-reference is remapped to the new objects.
+	Card data, scripts, event listeners and DSL selectors are shared with
+	the original since they are never mutated during a game.
+	\a memo maps the id() of original objects to their copies, the same
+	way copy.deepcopy() does, and can be used to find counterparts.
+	"""
+	# Copy method for each exact type, filled lazily by _handler_for()
+	_handlers = {}
+
+	def __init__(self, memo=None):
+		self.memo = {} if memo is None else memo
+		self.pending = []
+
+	def clone(self, obj):
+		ret = self.copy(obj)
+		handlers = self._handlers
+		share = Cloner._share
+		while self.pending:
+			old, new = self.pending.pop()
+			shared = getattr(old, "shared_attributes", ())
+			d = new.__dict__
+			d.update(old.__dict__)
+			for k, v in d.items():
+				handler = handlers.get(v.__class__) or self._handler_for(v.__class__)
+				if handler is not share and k not in shared:
+					d[k] = handler(self, v)
+		return ret
+
+	def copy(self, value):
+		handler = self._handlers.get(value.__class__) or self._handler_for(value.__class__)
+		return handler(self, value)
+
+	@classmethod
+	def _handler_for(cls, type):
+		if issubclass(type, ATOMIC_TYPES):
+			handler = cls._share
+		elif issubclass(type, (BaseEntity, AuraBuff, Action)):
+			handler = cls._copy_object
+		elif issubclass(type, list):
+			handler = cls._copy_list
+		elif issubclass(type, dict):
+			handler = cls._copy_dict
+		elif issubclass(type, tuple):
+			handler = cls._copy_tuple
+		elif issubclass(type, Manager):
+			handler = cls._copy_manager
+		elif issubclass(type, MethodType):
+			handler = cls._copy_method
+		else:
+			# Event listeners, selectors, card classes, ...
+			handler = cls._share
+		cls._handlers[type] = handler
+		return handler
+
+	def _share(self, value):
+		return value
+
+	def _copy_object(self, obj):
+		ret = self.memo.get(id(obj))
+		if ret is None:
+			ret = object.__new__(obj.__class__)
+			self.memo[id(obj)] = ret
+			self.pending.append((obj, ret))
+		return ret
+
+	def _copy_list(self, value):
+		ret = self.memo.get(id(value))
+		if ret is not None:
+			return ret
+		ret = list.__new__(value.__class__)
+		self.memo[id(value)] = ret
+		list.extend(ret, [self.copy(v) for v in value])
+		if getattr(value, "__dict__", None):
+			# eg. Deck.hero
+			ret.__dict__.update((k, self.copy(v)) for k, v in value.__dict__.items())
+		return ret
+
+	def _copy_dict(self, value):
+		ret = self.memo.get(id(value))
+		if ret is not None:
+			return ret
+		ret = value.copy()
+		self.memo[id(value)] = ret
+		for k, v in value.items():
+			ret[k] = self.copy(v)
+		return ret
+
+	def _copy_tuple(self, value):
+		ret = self.memo.get(id(value))
+		if ret is not None:
+			return ret
+		ret = tuple(self.copy(v) for v in value)
+		self.memo[id(value)] = ret
+		return ret
+
+	def _copy_manager(self, manager):
+		ret = self.memo.get(id(manager))
+		if ret is not None:
+			return ret
+		ret = object.__new__(manager.__class__)
+		self.memo[id(manager)] = ret
+		ret.__dict__.update(manager.__dict__)
+		ret.obj = self.copy(manager.obj)
+		# Observers (eg. Kettle) follow the original game only
+		ret.observers = []
+		return ret
+
+	def _copy_method(self, method):
+		return MethodType(method.__func__, self.copy(method.__self__))
+
+
+def clone(obj, memo=None):
+	"""
+	Return a copy of \a obj and of the game state it belongs to.
+	"""
+	return Cloner(memo).clone(obj)
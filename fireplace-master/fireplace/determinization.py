@@ -0,0 +1,109 @@
+"""
+Determinization of hidden information
+
+The game holds the actual hand and deck order of both players, which an
+agent should not be able to see. A Determinizer samples states which are
+consistent with what one player knows instead: the opponent's hidden hand
+cards and both decks are dealt again at random, from the opponent's deck
+list minus the cards it was seen playing.
+Samples are made on the game itself, journaled, and reuse the existing
+card entities wherever their id fits, so they cost a few zone moves
+rather than a copy of the game.
+"""
+import random
+from collections import Counter
+from hearthstone.enums import Zone
+
+
+class Determinizer:
+	"""
+	Samples determinizations of the game of \a player from their point of
+	view. \a deck is the list of card ids the opponent's hidden cards are
+	dealt from (their starting_deck by default), less the ones they played.
+	\a known(card) tells whether a card in the opponent's hand is known;
+	by default, created cards (eg. The Coin) are, as the game does not
+	track which cards were revealed.
+	"""
+	def __init__(self, player, deck=None, known=None):
+		self.player = player
+		self.game = player.game
+		if deck is None:
+			deck = player.opponent.starting_deck
+		# Deck lists can hold cards rather than ids (see card.princeWarlock())
+		self.deck = [getattr(card, "id", card) for card in deck]
+		self.known = known or _created
+
+	def __repr__(self):
+		return "<%s (for %r)>" % (self.__class__.__name__, self.player)
+
+	def hidden_ids(self):
+		"""
+		Returns a Counter of the card ids the opponent's hidden cards can be.
+		"""
+		opponent = self.player.opponent
+		ret = Counter(self.deck)
+		seen = [opponent.hero.power, opponent.weapon]
+		seen += opponent.field + opponent.secrets + opponent.graveyard + opponent.discarded
+		seen += [card for card in opponent.hand if self.known(card)]
+		ret.subtract(card.id for card in seen if card is not None and not _created(card))
+		return +ret
+
+	def sample(self):
+		"""
+		Deals the hidden cards again and returns a mark to pass to
+		game.rollback() to restore the actual state.
+		"""
+		mark = self.game.mark()
+		try:
+			self._deal(self.player.opponent)
+			random.shuffle(self.player.deck)
+		except Exception:
+			self.game.rollback(mark)
+			raise
+		return mark
+
+	def sample_game(self):
+		"""
+		Returns a copy of the game with the hidden cards dealt again.
+		"""
+		mark = self.sample()
+		try:
+			return self.game.clone()
+		finally:
+			self.game.rollback(mark)
+
+	def _deal(self, opponent):
+		hand = [card for card in opponent.hand if not self.known(card)]
+		deck = list(opponent.deck)
+		ids = list(self.hidden_ids().elements())
+		count = len(hand) + len(deck)
+		if len(ids) < count:
+			# Fill in with the actual cards missing from the deck list
+			missing = Counter(card.id for card in hand + deck) - Counter(ids)
+			ids += random.sample(list(missing.elements()), count - len(ids))
+		ids = random.sample(ids, count)
+		hand_ids = Counter(ids[:len(hand)])
+		deck_ids = Counter(ids[len(hand):])
+
+		# Cards already dealt one of their slots stay where they are
+		spare = {}
+		for cards, slots in ((hand, hand_ids), (deck, deck_ids)):
+			for card in cards:
+				if slots[card.id] > 0:
+					slots[card.id] -= 1
+				else:
+					spare.setdefault(card.id, []).append(card)
+		for slots, zone in ((hand_ids, Zone.HAND), (deck_ids, Zone.DECK)):
+			for id in slots.elements():
+				if spare.get(id):
+					spare[id].pop().zone = zone
+				else:
+					opponent.card(id, zone=zone)
+		for cards in spare.values():
+			for card in cards:
+				card.zone = Zone.SETASIDE
+		random.shuffle(opponent.deck)
+
+
+def _created(card):
+	return card.created or getattr(card, "creator", None) is not None
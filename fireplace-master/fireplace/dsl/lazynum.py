@@ -2,6 +2,7 @@ import copy
 import operator
 import random
 from abc import ABCMeta, abstractmethod
+from .. import chance
 from .evaluator import Evaluator
 
 
@@ -143,4 +144,6 @@ class RandomNumber(LazyNum):
 		return "%s(%r)" % (self.__class__.__name__, self.choices)
 
 	def evaluate(self, source):
+		if chance.handler is not None:
+			return self.num(chance.pick("NUMBER", self.choices, key=lambda choice: choice))
 		return self.num(random.choice(self.choices))
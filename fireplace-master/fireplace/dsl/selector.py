@@ -4,7 +4,7 @@ from abc import ABCMeta, abstractmethod
 from enum import IntEnum
 from hearthstone.enums import CardType, GameTag, Race, Rarity, Zone, CardClass
 from typing import Any, Union, List, Callable, Iterable, Optional, Set
-from .. import enums
+from .. import chance, enums
 from ..entity import BaseEntity
 from .lazynum import Attr, LazyValue, OpAttr
 
@@ -296,7 +296,14 @@ class RandomSelector(Selector):
 
 	def eval(self, entities, source):
 		child_entities = self.child.eval(entities, source)
-		return random.sample(child_entities, min(len(child_entities), self.times))
+		if chance.handler is None:
+			return random.sample(child_entities, min(len(child_entities), self.times))
+		ret = []
+		for i in range(min(len(child_entities), self.times)):
+			entity = chance.pick("RANDOM", child_entities)
+			child_entities = [e for e in child_entities if e is not entity]
+			ret.append(entity)
+		return ret
 
 	def __mul__(self, other):
 		return RandomSelector(self.child, self.times * other)
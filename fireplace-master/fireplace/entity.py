@@ -1,13 +1,17 @@
 import uuid
 from hearthstone.enums import CardType
 from . import logging
+from .journal import Journaled
+from .utils import CardList
 
 
-class BaseEntity(object):
+class BaseEntity(Journaled):
 	base_events = []
 	logger = logging.log
 	ignore_scripts = False
 	type = CardType.INVALID
+	# Attributes which are shared as is with clones of the entity
+	shared_attributes = ("data", )
 
 	def __init__(self):
 		self.manager = self.Manager(self)
@@ -16,9 +20,9 @@ class BaseEntity(object):
 		self.uuid = uuid.uuid4()
 
 		if self.data:
-			self._events = self.data.scripts.events[:]
+			self._events = CardList(self.data.scripts.events)
 		else:
-			self._events = []
+			self._events = CardList()
 
 	def __int__(self):
 		return self.entity_id
@@ -39,6 +43,16 @@ class BaseEntity(object):
 		if self.data and not self.ignore_scripts:
 			yield from self.data.scripts.update
 
+	def clone(self, memo=None):
+		"""
+		Return a copy of the entity, along with a copy of its game.
+		Card data and scripts are shared with the original.
+		If given, \a memo is filled with the id() of every copied object
+		mapped to its copy, which can be used to look up counterparts.
+		"""
+		from .clone import clone
+		return clone(self, memo)
+
 	def log(self, message, *args):
 		self.logger.info(message, *args)
 
@@ -87,8 +101,8 @@ class BaseEntity(object):
 class BuffableEntity(BaseEntity):
 	def __init__(self):
 		super().__init__()
-		self.buffs = []
-		self.slots = []
+		self.buffs = CardList()
+		self.slots = CardList()
 
 	def _getattr(self, attr, i):
 		i += getattr(self, "_" + attr, 0)
@@ -4,3 +4,7 @@ class InvalidAction(Exception):
 
 class GameOver(Exception):
 	pass
+
+
+class SearchAborted(Exception):
+	pass
@@ -3,6 +3,7 @@ import time
 from calendar import timegm
 from itertools import chain
 from hearthstone.enums import CardType, PlayState, BlockType, State, Step, Zone
+from . import journal, zobrist
 from .actions import Attack, BeginTurn, Death, EndTurn, EventListener, Play
 from .card import THE_COIN
 from .entity import Entity
@@ -82,6 +83,48 @@ class BaseGame(Entity):
 	def ended(self):
 		return self.state == State.COMPLETE
 
+	def mark(self):
+		"""
+		Start journaling changes to the game state and return a mark
+		which can later be passed to rollback() or commit().
+		Marks can be nested, but must be released innermost first.
+		"""
+		return journal.begin()
+
+	def rollback(self, mark):
+		"""
+		Restore the game to the exact state it was in at \a mark.
+		"""
+		journal.rollback(mark)
+
+	def commit(self, mark):
+		"""
+		Release \a mark, keeping the changes made since.
+		"""
+		journal.commit(mark)
+
+	def snapshot(self, mark, parent=None):
+		"""
+		Return the current state as a persistent journal.Delta on top of
+		\a parent, which must have been the state of the game at \a mark.
+		Only what changed since \a mark is stored.
+		"""
+		return journal.Delta(parent, journal.active.changes(mark))
+
+	def restore(self, state):
+		"""
+		Turn the game from its root state (where \a state and its parents
+		were snapshotted from) into \a state. Must be called inside a mark.
+		"""
+		state.apply()
+
+	def state_hash(self):
+		"""
+		Return a 64-bit Zobrist hash of the game state.
+		It is maintained incrementally between zobrist.start() and stop().
+		"""
+		return zobrist.state_hash(self)
+
 	def action_start(self, type, source, index, target):
 		self.manager.action_start(type, source, index, target)
 		if type != BlockType.PLAY:
@@ -0,0 +1,198 @@
+"""
+Reversible journal of game state changes
+
+While a journal is active, every attribute write on entities, aura buffs
+and managers and every mutation of a CardList is recorded, so that the
+game state can be rolled back to an earlier mark without copying it.
+Only the first change to a given attribute or list after a mark is kept.
+NOTE: There is a single active journal per process, so only one game
+should be modified while journaling.
+"""
+
+# Sentinel for attributes which did not exist before being written
+MISSING = object()
+
+# The currently active Journal, if any
+active = None
+
+# Called as observer(obj, name, old_value) after every attribute write
+# while set, journaled or not: dispatches to the functions of add_observer()
+observer = None
+_observers = []
+
+
+class Journal:
+	def __init__(self):
+		self.entries = []
+		self.depth = 0
+		# Attributes and lists already recorded since the last mark
+		self.seen = set()
+
+	def record_attr(self, obj, name):
+		key = (id(obj), name)
+		if key in self.seen:
+			return
+		self.seen.add(key)
+		self.entries.append((obj, name, obj.__dict__.get(name, MISSING)))
+
+	def record_list(self, lst):
+		key = id(lst)
+		if key in self.seen:
+			return
+		self.seen.add(key)
+		self.entries.append((lst, None, list.copy(lst)))
+
+	def mark(self):
+		self.seen.clear()
+		return len(self.entries)
+
+	def changes(self, mark):
+		"""
+		Return the current value of everything recorded since \a mark.
+		"""
+		ret = []
+		for obj, name, value in self.entries[mark:]:
+			if name is None:
+				ret.append((obj, None, list.copy(obj)))
+			else:
+				ret.append((obj, name, obj.__dict__.get(name, MISSING)))
+		return ret
+
+	def rollback(self, mark):
+		entries = self.entries
+		while len(entries) > mark:
+			obj, name, value = entries.pop()
+			if name is None:
+				list.__setitem__(obj, slice(None), value)
+			elif value is MISSING:
+				obj.__dict__.pop(name, None)
+			else:
+				obj.__dict__[name] = value
+		self.seen.clear()
+
+
+class Delta:
+	"""
+	A persistent game state, stored as the changes made on top of the
+	\a parent state (or the root state if None). Sibling states share
+	their parent, so each one only holds the attributes and zones that
+	its own actions touched.
+	"""
+	def __init__(self, parent, changes):
+		self.parent = parent
+		self.changes = changes
+
+	def __repr__(self):
+		return "<%s (%i changes)>" % (self.__class__.__name__, len(self.changes))
+
+	def apply(self):
+		"""
+		Turn the root state into this state. The changes are journaled,
+		so they can be rolled back like any other.
+		"""
+		if self.parent is not None:
+			self.parent.apply()
+		for obj, name, value in self.changes:
+			if name is None:
+				active.record_list(obj)
+				list.__setitem__(obj, slice(None), value)
+				continue
+			active.record_attr(obj, name)
+			if value is MISSING:
+				obj.__dict__.pop(name, None)
+			else:
+				obj.__dict__[name] = value
+
+
+def begin():
+	"""
+	Start journaling (if not already) and return a mark for the current
+	position in the journal. Every begin() must be matched by rollback()
+	or commit(), innermost first.
+	"""
+	global active
+	if active is None:
+		active = Journal()
+		_update_hooks()
+	active.depth += 1
+	return active.mark()
+
+
+def _release():
+	global active
+	active.depth -= 1
+	if not active.depth:
+		active = None
+		_update_hooks()
+
+
+def rollback(mark):
+	"""
+	Undo every change recorded since \a mark.
+	"""
+	active.rollback(mark)
+	_release()
+
+
+def commit(mark):
+	"""
+	Keep the changes recorded since \a mark.
+	Outer marks can still roll them back.
+	"""
+	_release()
+
+
+def add_observer(func):
+	"""
+	Call func(obj, name, old_value) after every attribute write, until
+	remove_observer(func) (see zobrist.py and accumulator.py).
+	"""
+	_observers.append(func)
+	_set_observer()
+
+
+def remove_observer(func):
+	_observers.remove(func)
+	_set_observer()
+
+
+def _set_observer():
+	global observer
+	observers = tuple(_observers)
+	if len(observers) > 1:
+		def observer(obj, name, old):
+			for func in observers:
+				func(obj, name, old)
+	else:
+		observer = observers[0] if observers else None
+	_update_hooks()
+
+
+def _journaled_setattr(self, name, value):
+	active.record_attr(self, name)
+	object.__setattr__(self, name, value)
+
+
+def _observed_setattr(self, name, value):
+	old = self.__dict__.get(name, MISSING)
+	if active is not None:
+		active.record_attr(self, name)
+	object.__setattr__(self, name, value)
+	observer(self, name, old)
+
+
+def _update_hooks():
+	if observer is not None:
+		Journaled.__setattr__ = _observed_setattr
+	elif active is not None:
+		Journaled.__setattr__ = _journaled_setattr
+	elif "__setattr__" in Journaled.__dict__:
+		del Journaled.__setattr__
+
+
+class Journaled:
+	"""
+	Base class for objects whose attribute writes are journaled.
+	The hooks are only installed while a journal or an observer is
+	active, so that they cost nothing the rest of the time.
+	"""
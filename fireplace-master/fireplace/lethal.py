@@ -0,0 +1,180 @@
+"""
+Arithmetic bounds on the face damage of a turn
+
+These functions read the board and the hand without making any move, so
+that a search can tell cheaply whether lethal is out of reach (and skip
+looking for it) or trivially available.
+The damage of cards and hero powers is read from their play and activate
+scripts: Hit actions which can reach the enemy hero, and ManaThisTurn
+actions for the mana they give. Scripts written as functions cannot be
+read, so they make the bound infinite, as do all the effects it cannot
+count: other actions (eg. buffs), spell damage, auras, and effects
+triggered by events or deathrattles, in hand or on the board.
+"""
+from hearthstone.enums import CardType
+from .actions import Hit, ManaThisTurn
+from .dsl.selector import TARGET, RandomSelector
+
+
+INFINITY = float("inf")
+
+
+def _reaches_hero(card, selector, hero):
+	# Cards compare equal by id, and both heroes can have the same one
+	if selector is TARGET:
+		return card.requires_target() and any(target is hero for target in card.targets)
+	if isinstance(selector, RandomSelector):
+		selector = selector.child
+	return any(target is hero for target in selector.eval(card.game, card))
+
+
+def _uncounted(entity, script):
+	"""
+	Returns True if \a entity, or its actions in \a script, can add damage
+	which the bound does not count.
+	"""
+	scripts = entity.data.scripts
+	if scripts.events or scripts.update or scripts.deathrattle or getattr(entity, "spellpower", 0):
+		return True
+	if callable(script):
+		return True
+	return any(not isinstance(action, (Hit, ManaThisTurn)) for action in script)
+
+
+def _card_uncounted(card):
+	if card.must_choose_one:
+		return _uncounted(card, ()) or any(_uncounted(choose, choose.data.scripts.play) for choose in card.choose_cards)
+	return _uncounted(card, card.data.scripts.play)
+
+
+def _script_effects(card, script, hero):
+	"""
+	Returns the (face damage, mana given) of the actions of \a script.
+	"""
+	if callable(script):
+		return INFINITY, 0
+	damage = mana = 0
+	for action in script:
+		if not isinstance(action, (Hit, ManaThisTurn)):
+			continue
+		selector, amount = action._args[:2]
+		times = action.times
+		if not isinstance(amount, int) or not isinstance(times, int):
+			return INFINITY, 0
+		if isinstance(action, ManaThisTurn):
+			mana += amount * times
+		elif _reaches_hero(card, selector, hero):
+			damage += card.get_damage(amount, hero) * times
+	return damage, mana
+
+
+def _card_effects(card, hero):
+	"""
+	Returns the (face damage, mana given) of playing \a card from the hand.
+	"""
+	if card.must_choose_one:
+		effects = [_script_effects(card, choose.data.scripts.play, hero) for choose in card.choose_cards]
+		return max(effects) if effects else (0, 0)
+	damage, mana = _script_effects(card, card.data.scripts.play, hero)
+	if card.type == CardType.MINION and card.charge and not card.cant_attack:
+		damage += card.atk * (card.windfury + 1)
+	elif card.type == CardType.WEAPON:
+		damage += card.atk * (card.windfury + 1)
+	return damage, mana
+
+
+def _attacks(player):
+	"""
+	Returns the attack of every attack the characters of \a player have left.
+	"""
+	ret = []
+	for character in player.characters:
+		if character.cant_attack or character.frozen or character.exhausted or not character.atk:
+			continue
+		if getattr(character, "cannot_attack_heroes", False):
+			continue
+		ret += [character.atk] * (character.max_attacks - character.num_attacks)
+	return ret
+
+
+def _best_spend(items, mana):
+	"""
+	0/1 knapsack: returns the most damage from the (cost, damage) \a items
+	within \a mana.
+	"""
+	best = [0] * (mana + 1)
+	for cost, damage in items:
+		for budget in range(mana, cost - 1, -1):
+			best[budget] = max(best[budget], best[budget - cost] + damage)
+	return best[mana]
+
+
+def damage_bound(player):
+	"""
+	Returns an upper bound on the damage \a player can deal to the enemy
+	hero this turn: every attack left, plus the most damage the cards and
+	the hero power can add with the mana available, counting the mana the
+	cards give (eg. The Coin), or INFINITY
+	if any of them can add damage which is not counted.
+	Enemy taunts are only accounted for when nothing can be played, as
+	cards and the hero power could otherwise remove them.
+	"""
+	hero = player.opponent.hero
+	if hero.immune:
+		return 0
+	# Enemy deathrattles and triggers can hit their own hero too
+	entities = list(player.characters) + [player.weapon] + list(player.opponent.characters)
+	for entity in entities:
+		if entity is not None and _uncounted(entity, ()):
+			return INFINITY
+	attacks = _attacks(player)
+	mana = player.mana
+	items = []
+	# Cards which give mana (eg. The Coin) can make others playable, so
+	# the hand is read until no card within the mana reached is left
+	counted = set()
+	changed = True
+	while changed:
+		changed = False
+		for card in player.hand:
+			if id(card) in counted or not (card.is_playable() or card.cost <= mana):
+				continue
+			counted.add(id(card))
+			changed = True
+			if _card_uncounted(card):
+				return INFINITY
+			damage, extra_mana = _card_effects(card, hero)
+			if damage == INFINITY:
+				return INFINITY
+			mana += extra_mana
+			if damage:
+				items.append((card.cost, damage))
+	power = player.hero.power
+	if power.is_usable():
+		if _uncounted(power, power.data.scripts.activate):
+			return INFINITY
+		damage = _script_effects(power, power.data.scripts.activate, hero)[0]
+		if damage == INFINITY:
+			return INFINITY
+		if damage:
+			items.append((power.cost, damage))
+
+	if not items and not power.is_usable() and not counted:
+		taunts = [minion for minion in player.opponent.field if minion.taunt and minion.attackable]
+		# Each taunt takes at least one attack
+		attacks = sorted(attacks)[len(taunts):]
+	return sum(attacks) + _best_spend(items, min(mana, player.max_resources))
+
+
+def trivial_lethal(player):
+	"""
+	Returns True if attacking the enemy hero with every character is
+	lethal: enough attack to get through the enemy health and armor, no
+	taunt in the way and no secret which could get in the way.
+	"""
+	opponent = player.opponent
+	if opponent.secrets or opponent.hero.immune:
+		return False
+	if any(minion.taunt and minion.attackable for minion in opponent.field):
+		return False
+	return sum(_attacks(player)) >= opponent.hero.health + opponent.hero.armor
@@ -1,8 +1,9 @@
 from hearthstone.enums import GameTag
 from . import enums
+from .journal import Journaled
 
 
-class Manager(object):
+class Manager(Journaled):
 	def __init__(self, obj):
 		self.obj = obj
 		self.observers = []
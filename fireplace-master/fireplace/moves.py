@@ -0,0 +1,197 @@
+"""
+Move generation, shared by the agents (see utils.py) and Kettle
+
+A move is identified by the entity_ids of the entities it involves rather
+than by its index in the list of legal moves. Entity ids are kept by clones
+and journal rollbacks, so the same move can be looked up in any copy of the
+state it was generated from, and stays valid while other moves are made.
+"""
+from collections import namedtuple
+from hearthstone.enums import GameTag, Zone
+from .exceptions import InvalidAction
+
+
+# type is one of "CARD", "HEROPOWER", "ATTACK" and "END_TURN"; source, choose
+# (the Choose One card picked) and target are entity_ids, or None
+Move = namedtuple("Move", ("type", "source", "choose", "target"))
+
+END_TURN = Move("END_TURN", None, None, None)
+
+
+class MoveGenerator:
+	"""
+	Enumerates every legal move of \a player in one pass, in the order
+	of get_all_available_actions(): playable cards (once per Choose One
+	card), the hero power, attacks and ending the turn, each followed by
+	its targets. The entities of every move are kept, so that moves can be
+	applied to the current state without enumerating them again.
+	If \a unique is True, equivalent sources (eg. two copies of a card in
+	hand) and equivalent targets only get moves for the first of them, as
+	the others lead to the same states up to entity ids and positions
+	(see signature()).
+	"""
+	def __init__(self, player, unique=False):
+		self.player = player
+		self.unique = unique
+		self._signatures = {}
+		self.moves = []
+		# Move -> (source, choose, target) entities
+		self.entities = {}
+		# (source, targets) of every action but ending the turn
+		self.sources = []
+		for card in self._representatives(player.hand):
+			if not card.is_playable():
+				continue
+			if card.must_choose_one:
+				count = len(self.moves)
+				targets = []
+				for choose in card.choose_cards:
+					if choose.requires_target():
+						# Card.play() checks the target against the parent card
+						play_targets = card.play_targets
+						choose_targets = [t for t in choose.targets if t in play_targets]
+						targets += self._add("CARD", card, choose, self._representatives(choose_targets))
+					else:
+						self._add("CARD", card, choose, [None])
+				if len(self.moves) > count:
+					self.sources.append((card, _unique(targets)))
+			else:
+				self._add_action("CARD", card, card.targets if card.requires_target() else None)
+		heropower = player.hero.power
+		if heropower.is_usable():
+			self._add_action("HEROPOWER", heropower, heropower.targets if heropower.requires_target() else None)
+		for character in self._representatives(player.characters):
+			if character.can_attack():
+				self._add_action("ATTACK", character, character.targets)
+		self.moves.append(END_TURN)
+		self.entities[END_TURN] = (None, None, None)
+
+	def __repr__(self):
+		return "<%s (%i moves for %r)>" % (self.__class__.__name__, len(self.moves), self.player)
+
+	def __iter__(self):
+		return iter(self.moves)
+
+	def __len__(self):
+		return len(self.moves)
+
+	def __contains__(self, move):
+		return move in self.entities
+
+	def _add(self, type, source, choose, targets):
+		added = []
+		for target in targets:
+			move = Move(
+				type, source.entity_id, choose.entity_id if choose is not None else None,
+				target.entity_id if target is not None else None
+			)
+			self.moves.append(move)
+			self.entities[move] = (source, choose, target)
+			if target is not None:
+				added.append(target)
+		return added
+
+	def _add_action(self, type, source, targets):
+		if targets is not None:
+			targets = self._representatives(targets)
+		self._add(type, source, None, [None] if targets is None else targets)
+		self.sources.append((source, targets or []))
+
+	def _representatives(self, entities):
+		if not self.unique:
+			return list(entities)
+		ret = []
+		seen = set()
+		for entity in entities:
+			key = self._signatures.get(entity.entity_id)
+			if key is None:
+				key = self._signatures[entity.entity_id] = signature(entity)
+			if key not in seen:
+				seen.add(key)
+				ret.append(entity)
+		return ret
+
+	def apply(self, move):
+		"""
+		Makes \a move, which must have been generated for the current state.
+		Returns True if it ended the game or the turn, False otherwise.
+		"""
+		return _apply(self.player, move, *self.entities[move])
+
+
+def signature(entity):
+	"""
+	Returns a hashable summary of what can be observed of \a entity: its
+	tags (with entities as their entity_id) and its buffs, but neither its
+	own entity_id nor its position in hand. Positions in play are kept, as
+	effects can depend on them (eg. Explosive Shot hits adjacent minions).
+	"""
+	from .entity import BaseEntity
+	ret = [tuple(buff.id for buff in getattr(entity, "buffs", ()))]
+	for tag, value in entity.tags.items():
+		if tag == GameTag.ZONE_POSITION and entity.zone != Zone.PLAY:
+			continue
+		if isinstance(value, BaseEntity):
+			value = value.entity_id
+		elif isinstance(value, list):
+			value = tuple(value)
+		ret.append((tag, value))
+	return tuple(ret)
+
+
+def _unique(entities):
+	# Cards compare equal by id: only drop the same entity listed twice
+	ret = []
+	seen = set()
+	for entity in entities:
+		if id(entity) not in seen:
+			seen.add(id(entity))
+			ret.append(entity)
+	return ret
+
+
+def _find(entities, entity_id):
+	for entity in entities:
+		if entity.entity_id == entity_id:
+			return entity
+	raise InvalidAction("No entity %r to make the move with" % (entity_id))
+
+
+def resolve(player, move):
+	"""
+	Returns the (source, choose, target) entities of \a move in the game of
+	\a player. Raises InvalidAction if one of them cannot be found.
+	"""
+	if move.type == "CARD":
+		source = _find(player.hand, move.source)
+	elif move.type == "HEROPOWER":
+		source = _find([player.hero.power], move.source)
+	elif move.type == "ATTACK":
+		source = _find(player.characters, move.source)
+	else:
+		return (None, None, None)
+	choose = _find(source.choose_cards, move.choose) if move.choose is not None else None
+	target = _find(player.game.characters, move.target) if move.target is not None else None
+	return (source, choose, target)
+
+
+def apply_move(player, move):
+	"""
+	Makes \a move for \a player, looking its entities up by entity_id (eg.
+	in a clone of the game the move was generated in).
+	Returns True if it ended the game or the turn, False otherwise.
+	"""
+	return _apply(player, move, *resolve(player, move))
+
+
+def _apply(player, move, source, choose, target):
+	if move.type == "CARD":
+		source.play(target=target, choose=choose.id if choose is not None else None)
+	elif move.type == "HEROPOWER":
+		source.use(target=target)
+	elif move.type == "ATTACK":
+		source.attack(target)
+	else:
+		player.game.end_turn()
+		return True
+	return player.game.ended
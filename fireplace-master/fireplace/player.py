@@ -24,6 +24,7 @@ class Player(Entity, TargetableByAuras):
 	spellpower_adjustment = slot_property("spellpower", sum)
 	spells_cost_health = slot_property("spells_cost_health")
 	type = CardType.PLAYER
+	shared_attributes = ("data", "starting_deck", "starting_hero")
 
 	def __init__(self, name, deck, hero):
 		self.starting_deck = deck
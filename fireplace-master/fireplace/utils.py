@@ -1,12 +1,21 @@
+import math
 import random
 import os.path
+import time
 from bisect import bisect
 from importlib import import_module
 from pkgutil import iter_modules
 from typing import List
 from xml.etree import ElementTree
-from hearthstone.enums import CardClass, CardType, Rarity
-import collections, copy
+from hearthstone.enums import CardClass, CardType, PlayState, Rarity
+try:
+	import numpy
+except ImportError:
+	numpy = None
+from . import accumulator, chance, journal
+from .exceptions import InvalidAction, SearchAborted
+from .moves import Move, MoveGenerator, apply_move, resolve
+import collections
 
 # Autogenerate the list of cardset modules
 _cards_module = os.path.join(os.path.dirname(__file__), "cards")
@@ -30,6 +39,50 @@ class CardList(list):
 		# Used in Kettle to easily serialize CardList to json
 		return len(self)
 
+	def _record(self):
+		if journal.active is not None:
+			journal.active.record_list(self)
+
+	def __setitem__(self, key, value):
+		self._record()
+		super().__setitem__(key, value)
+
+	def __delitem__(self, key):
+		self._record()
+		super().__delitem__(key)
+
+	def __iadd__(self, other):
+		self._record()
+		return super().__iadd__(other)
+
+	def append(self, x):
+		self._record()
+		super().append(x)
+
+	def clear(self):
+		self._record()
+		super().clear()
+
+	def extend(self, iterable):
+		self._record()
+		super().extend(iterable)
+
+	def insert(self, i, x):
+		self._record()
+		super().insert(i, x)
+
+	def pop(self, i=-1):
+		self._record()
+		return super().pop(i)
+
+	def reverse(self):
+		self._record()
+		super().reverse()
+
+	def sort(self, *args, **kwargs):
+		self._record()
+		super().sort(*args, **kwargs)
+
 	def contains(self, x):
 		"True if list contains any instance of x"
 		for item in self:
@@ -152,11 +205,14 @@ def weighted_card_choice(source, weights: List[int], card_sets: List[str], count
 
 	# for each card
 	for i in range(count):
-		# choose a set according to weighting
-		chosen_set = bisect(cum_weights, random.random() * totalweight)
+		if chance.handler is not None:
+			chosen_set, chosen_card_index = _pick_weighted_card(weights, card_sets)
+		else:
+			# choose a set according to weighting
+			chosen_set = bisect(cum_weights, random.random() * totalweight)
 
-		# choose a random card from that set
-		chosen_card_index = random.randint(0, len(card_sets[chosen_set]) - 1)
+			# choose a random card from that set
+			chosen_card_index = random.randint(0, len(card_sets[chosen_set]) - 1)
 
 		chosen_cards.append(card_sets[chosen_set].pop(chosen_card_index))
 		totalweight -= weights[chosen_set]
@@ -165,6 +221,18 @@ def weighted_card_choice(source, weights: List[int], card_sets: List[str], count
 	return [source.controller.card(card, source=source) for card in chosen_cards]
 
 
+def _pick_weighted_card(weights, card_sets):
+	"""
+	Returns the (set index, card index) of a card picked as a chance event
+	of weighted_card_choice(), copies of a card counting as one outcome.
+	"""
+	locations = [(i, j) for i, cards in enumerate(card_sets) for j in range(len(cards))]
+	return chance.pick(
+		"CARD", locations, [weights[i] for i, j in locations],
+		key=lambda location: card_sets[location[0]][location[1]]
+	)
+
+
 def setup_game() -> ".game.Game":
 	from .game import Game
 	from .player import Player
@@ -219,47 +287,52 @@ def setFeatures(featuresToUse):
 	currFeatures= featuresToUse
 
 #feature extraction v2
-def featureExtractor2(player, game:".game.Game") -> ".game.Game":
+# The features of featureExtractor2, in the order of the columns of featureRow()
+FEATURES = (
+	"bias", "board_mana_advantage", "mana_efficiency", "hand_advantage",
+	"minion_advantage", "minion_power_advantage", "hp_advantage",
+)
 
+def featureExtractor2(player, game:".game.Game") -> ".game.Game":
 	features = collections.defaultdict(int)
-	our_hp = player.hero.health + player.hero.armor
-	opp_hp = player.opponent.hero.health + player.opponent.hero.armor
-	# features['our_hp'] = our_hp
-	# features['opponent_hp'] = opp_hp
-	features['bias'] = 1
-	# features["our_hand"] = len(player.hand)
-	# features['their_hand'] = len(player.opponent.hand)
-    #
-	# features['mana_left'] = player.mana
-
-	our_total_power = 0
-	for card in player.field:
-		our_total_power += card.atk
-	# features["our_power"] = our_total_power
-	opp_total_power = 0
-	for card in player.opponent.field:
-		opp_total_power += card.atk
-	# features["their_power"] = opp_total_power
-
-	# features["our_minion"] = len(player.field)
-	# features["their_minions"] = len(player.opponent.field)
-
-	board_mana = sum([minion.cost for minion in player.field])
-	opp_board_mana = sum([minion.cost for minion in player.opponent.field])
-	features["board_mana_advantage"] = board_mana - opp_board_mana
-
-	features["mana_efficiency"] = player.total_mana_spent - player.opponent.total_mana_spent
-	features["hand_advantage"] = len(player.hand) - len(player.opponent.hand)
-	features["minion_advantage"] = len(player.field) - len(player.opponent.field)
-	features["minion_power_advantage"] = our_total_power - opp_total_power
-	features["hp_advantage"] = our_hp - opp_hp
-	# print("mana_efficiency: ", features["mana_efficiency"])
-
-	# for feature in features:
-	# 	if feature not in currFeatures:
-	# 		features[feature] = 0
+	features.update(zip(FEATURES, featureRow(player, game, [0] * len(FEATURES))))
 	return features
 
+def featureRow(player, game, row=None):
+	"""
+	Writes the featureExtractor2 features of \a player into \a row (a new
+	one by default), in the order of FEATURES, and returns it. Rows are
+	NumPy arrays, or lists without NumPy.
+	"""
+	if row is None:
+		row = numpy.empty(len(FEATURES)) if numpy is not None else [0] * len(FEATURES)
+	opponent = player.opponent
+	# Maintained incrementally while accumulator tracking is on
+	atk, cost = accumulator.field_totals(player)
+	opponent_atk, opponent_cost = accumulator.field_totals(opponent)
+	row[0] = 1
+	row[1] = cost - opponent_cost
+	row[2] = player.total_mana_spent - opponent.total_mana_spent
+	row[3] = len(player.hand) - len(opponent.hand)
+	row[4] = len(player.field) - len(opponent.field)
+	row[5] = atk - opponent_atk
+	row[6] = player.hero.health + player.hero.armor - opponent.hero.health - opponent.hero.armor
+	return row
+
+def featureMatrix(states, matrix=None):
+	"""
+	Writes the featureRow() of every (player, game) of \a states into the
+	rows of \a matrix (a new N x len(FEATURES) one by default) and returns it.
+	"""
+	if matrix is None:
+		if numpy is not None:
+			matrix = numpy.empty((len(states), len(FEATURES)))
+		else:
+			matrix = [[0] * len(FEATURES) for state in states]
+	for row, (player, game) in zip(matrix, states):
+		featureRow(player, game, row)
+	return matrix
+
 def featureExtractor3(player, game:".game.Game") -> ".game.Game":
 	features = collections.defaultdict(int)
 	features["bias"] = 1
@@ -278,8 +351,31 @@ def featureExtractor3(player, game:".game.Game") -> ".game.Game":
 		features["no power advantage"] = 1
 	return features
 
+class _Weights(collections.defaultdict):
+	"""
+	The weights of approximateV, counting the changes made to them in
+	version, so that cached values can tell when they are stale.
+	"""
+	version = 0
+
+	def __setitem__(self, key, value):
+		self.version += 1
+		super().__setitem__(key, value)
+
+	def __delitem__(self, key):
+		self.version += 1
+		super().__delitem__(key)
+
+	def update(self, *args, **kwargs):
+		self.version += 1
+		super().update(*args, **kwargs)
+
+	def clear(self):
+		self.version += 1
+		super().clear()
+
 # initialise the weights to previously calculated optimal values
-_weights = collections.defaultdict(float)
+_weights = _Weights(float)
 #baseline, weights all 0
 # premade_weights = {'their_hand': 0, 'our_hand': 0, 'our_power': 0, 'bias': 0, 'their_power': 0, 'opponent_hp': 0, 'our_hp': 0, 'our_minion': 0, 'mana_left': 0, 'their_minions': 0}
 #premade_weights = {'our_hp': 1.8673489184303163, 'opponent_hp': -3.037539913253422, 'bias': 10.412656424974298, 'our_hand': 2.153127765674754, 'their_hand': 0.9804111235739774, 'mana_left': -0.2590213226410433, 'our_power': 2.451094822043288, 'their_power': -1.3346142482372798, 'our_minion': -0.004790280977330176, 'their_minions': -2.4850411791904015}
@@ -321,8 +417,362 @@ def setTDWeights(tdweights):
 
 
 def approximateV(player, game):
-	phi = featureExtractor2(player, game)
-	return sum(phi[x] * _weights[x] for x in phi)
+	return evaluator.value(player, game)
+
+
+class Evaluator:
+	"""
+	Base class of the evaluation functions of the agents, which all go
+	through approximateV() and batchApproximateRows() to the current
+	evaluator. batch() is the main entry point: it returns the values of
+	a N x len(FEATURES) matrix of featureRow() rows, as a list.
+	version changes whenever the values returned do (see ValueCache).
+	"""
+	version = 0
+
+	def batch(self, matrix):
+		raise NotImplementedError
+
+	def value(self, player, game):
+		return self.batch([featureRow(player, game)])[0]
+
+
+class LinearEvaluator(Evaluator):
+	"""
+	The dot product of the features with \a weights (_weights by default).
+	Weights which do not count their changes are copied into a _Weights,
+	so that cached values can tell when they are stale: change them through
+	the weights attribute.
+	"""
+	def __init__(self, weights=None):
+		if weights is not None and not isinstance(weights, _Weights):
+			weights = _Weights(float, weights)
+		self.weights = weights
+
+	def __repr__(self):
+		return "<%s>" % (self.__class__.__name__)
+
+	@property
+	def version(self):
+		weights = _weights if self.weights is None else self.weights
+		return weights.version
+
+	def batch(self, matrix):
+		weights = weightVector(self.weights)
+		if numpy is None:
+			return [sum(x * w for x, w in zip(row, weights)) for row in matrix]
+		if not len(matrix):
+			return []
+		return (numpy.asarray(matrix, dtype=float) @ weights).tolist()
+
+	def value(self, player, game):
+		# A single row is cheaper without NumPy
+		weights = _weights if self.weights is None else self.weights
+		row = featureRow(player, game, [0] * len(FEATURES))
+		return sum(x * weights.get(name, 0.) for name, x in zip(FEATURES, row))
+
+
+class MLPEvaluator(Evaluator):
+	"""
+	A small CPU-only NumPy multilayer perceptron over the features: inputs
+	standardized, one layer of \a hidden ReLU units and a linear output.
+	Weights are drawn at random (from \a seed) until fit() is called.
+	"""
+	def __init__(self, hidden=16, seed=None):
+		if numpy is None:
+			raise ImportError("MLPEvaluator requires NumPy")
+		rng = numpy.random.RandomState(seed)
+		inputs = len(FEATURES)
+		self.mean = numpy.zeros(inputs)
+		self.std = numpy.ones(inputs)
+		self.w1 = rng.randn(inputs, hidden) * math.sqrt(2. / inputs)
+		self.b1 = numpy.zeros(hidden)
+		self.w2 = rng.randn(hidden) * math.sqrt(1. / hidden)
+		self.b2 = 0.
+		self.version = 0
+
+	def __repr__(self):
+		return "<%s (%i hidden units)>" % (self.__class__.__name__, len(self.b1))
+
+	def _forward(self, matrix):
+		x = (numpy.asarray(matrix, dtype=float) - self.mean) / self.std
+		h = numpy.maximum(x @ self.w1 + self.b1, 0.)
+		return x, h, h @ self.w2 + self.b2
+
+	def batch(self, matrix):
+		if not len(matrix):
+			return []
+		return self._forward(matrix)[2].tolist()
+
+	def fit(self, rows, targets, epochs=100, alpha=0.01, batch_size=64, seed=None):
+		"""
+		Regresses the values of \a rows onto \a targets (eg. values of
+		another evaluator, or returns) by minibatch gradient descent on the
+		squared error. Inputs are standardized over \a rows first.
+		Returns the mean squared error on \a rows once done.
+		"""
+		rows = numpy.asarray(rows, dtype=float)
+		targets = numpy.asarray(targets, dtype=float)
+		std = rows.std(axis=0)
+		# Constant features (eg. the bias) are left as they are
+		constant = std == 0
+		self.mean = numpy.where(constant, 0., rows.mean(axis=0))
+		self.std = numpy.where(constant, 1., std)
+		rng = numpy.random.RandomState(seed)
+		for epoch in range(epochs):
+			order = rng.permutation(len(rows))
+			for start in range(0, len(order), batch_size):
+				batch = order[start:start + batch_size]
+				x, h, values = self._forward(rows[batch])
+				errors = (values - targets[batch]) / len(batch)
+				grad_h = numpy.outer(errors, self.w2) * (h > 0)
+				self.w2 -= alpha * (h.T @ errors)
+				self.b2 -= alpha * errors.sum()
+				self.w1 -= alpha * (x.T @ grad_h)
+				self.b1 -= alpha * grad_h.sum(axis=0)
+		self.version += 1
+		return float(numpy.mean((self._forward(rows)[2] - targets) ** 2))
+
+
+# The Evaluator of approximateV(), and so of every agent
+evaluator = LinearEvaluator()
+
+class ValueCache:
+	"""
+	A bounded cache of approximateV values keyed by state hash (see
+	Game.state_hash()) and side, evicting the least recently used entries
+	once it holds more than \a size of them. Entries are dropped whenever
+	the evaluator or its version (eg. _weights) change. Values are only
+	cached while zobrist tracking is on, as hashing a state from scratch
+	costs more than evaluating it.
+	"""
+	def __init__(self, size=1 << 16):
+		self.size = size
+		self.entries = collections.OrderedDict()
+		self.evaluator = evaluator
+		self.version = evaluator.version
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __repr__(self):
+		return "<%s (%i/%i entries, %i hits, %i misses)>" % (
+			self.__class__.__name__, len(self), self.size, self.hits, self.misses
+		)
+
+	@property
+	def hit_rate(self):
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.
+
+	def clear(self):
+		self.entries.clear()
+		self.evaluator = evaluator
+		self.version = evaluator.version
+
+	def value(self, player, game):
+		"""
+		Returns approximateV(player, game), looking it up first.
+		"""
+		from . import zobrist
+		if not zobrist.tracking():
+			return approximateV(player, game)
+		if self.evaluator is not evaluator or self.version != evaluator.version:
+			self.clear()
+		entries = self.entries
+		key = game.state_hash() ^ zobrist.side_key(game.players.index(player))
+		ret = entries.get(key)
+		if ret is not None:
+			self.hits += 1
+			entries.move_to_end(key)
+			return ret
+		self.misses += 1
+		ret = entries[key] = approximateV(player, game)
+		if len(entries) > self.size:
+			entries.popitem(last=False)
+		return ret
+
+# If set, the values of the search agents are looked up in this ValueCache
+value_cache = None
+
+def _cached_value(player, game):
+	if value_cache is not None:
+		return value_cache.value(player, game)
+	return approximateV(player, game)
+
+def weightVector(weights=None):
+	"""
+	Returns the weights of FEATURES (_weights by default) in their order,
+	as a NumPy array, or a list without NumPy.
+	"""
+	if weights is None:
+		weights = _weights
+	ret = [weights.get(x, 0.) for x in FEATURES]
+	return numpy.array(ret) if numpy is not None else ret
+
+def batchApproximateRows(matrix):
+	"""
+	Returns the approximateV of every feature row of \a matrix (see
+	featureMatrix()), as a list, with a single call to the evaluator
+	(a single dot product for the linear one).
+	"""
+	return evaluator.batch(matrix)
+
+def batchApproximateStates(states):
+	"""
+	Returns the approximateV of every (player, game) of \a states, as a list.
+	"""
+	return batchApproximateRows(featureMatrix(states))
+
+class TDLearner:
+	"""
+	Linear TD(lambda) over featureRow() rows, with the weights and the
+	eligibility traces kept as NumPy arrays.
+	\a alpha is the step size, \a gamma the discount and \a lambda_ the
+	decay of the traces (0 for TD(0), as incorporateFeedback() does).
+	The weights are loaded from \a weights (_weights by default) and
+	written back to them after every update, so that the LinearEvaluator
+	follows what is learned; changes made to a _Weights meanwhile are
+	picked up.
+	If \a record is True, the transitions of step() are also kept in
+	transitions, to be learned from again by replay().
+	"""
+	def __init__(self, alpha=0.001, gamma=0.9, lambda_=0., weights=None, record=False):
+		if numpy is None:
+			raise ImportError("TDLearner requires NumPy")
+		self.alpha = alpha
+		self.gamma = gamma
+		self.lambda_ = lambda_
+		self.target = _weights if weights is None else weights
+		self.weights = weightVector(self.target)
+		self._version = getattr(self.target, "version", None)
+		self.traces = numpy.zeros(len(FEATURES))
+		# (row, reward, next_row or None) tuples
+		self.transitions = [] if record else None
+		self.updates = 0
+		# The game of the current episode (see TDLearningPlayer)
+		self.episode = None
+
+	def __repr__(self):
+		return "<%s (alpha=%r, gamma=%r, lambda=%r, %i updates)>" % (
+			self.__class__.__name__, self.alpha, self.gamma, self.lambda_, self.updates
+		)
+
+	@property
+	def config(self):
+		return {"alpha": self.alpha, "gamma": self.gamma, "lambda_": self.lambda_}
+
+	def _pull(self):
+		version = getattr(self.target, "version", None)
+		if version is not None and version != self._version:
+			self.weights = weightVector(self.target)
+			self._version = version
+
+	def _push(self):
+		self.target.update(zip(FEATURES, self.weights.tolist()))
+		self._version = getattr(self.target, "version", None)
+
+	def value(self, row):
+		self._pull()
+		return float(numpy.dot(row, self.weights))
+
+	def reset(self):
+		"""
+		Clears the eligibility traces, at the start of an episode.
+		"""
+		self.traces.fill(0.)
+
+	def step(self, row, reward, next_row=None):
+		"""
+		Learns from the transition from the state of \a row to the one of
+		\a next_row (None if it ended the episode, which also clears the
+		traces) with \a reward. Returns the TD error.
+		"""
+		self._pull()
+		weights = self.weights
+		row = numpy.asarray(row, dtype=float)
+		target = reward
+		if next_row is not None:
+			target += self.gamma * numpy.dot(next_row, weights)
+		delta = target - numpy.dot(row, weights)
+		traces = self.traces
+		traces *= self.gamma * self.lambda_
+		traces += row
+		weights += (self.alpha * delta) * traces
+		if next_row is None:
+			self.reset()
+		if self.transitions is not None:
+			self.transitions.append((row, reward, next_row))
+		self.updates += 1
+		self._push()
+		return float(delta)
+
+	def batch_update(self, rows, rewards, next_rows, terminals):
+		"""
+		TD(0) update over a minibatch of N transitions at once: \a rows and
+		\a next_rows are N x len(FEATURES) matrices, \a rewards and
+		\a terminals (whether each transition ended its episode) have N
+		values. The update is the mean of the transitions' updates.
+		Returns the TD errors.
+		"""
+		self._pull()
+		rows = numpy.asarray(rows, dtype=float)
+		next_values = numpy.asarray(next_rows, dtype=float) @ self.weights
+		next_values[numpy.asarray(terminals, dtype=bool)] = 0.
+		deltas = numpy.asarray(rewards, dtype=float) + self.gamma * next_values - rows @ self.weights
+		self.weights += (self.alpha / len(rows)) * (deltas @ rows)
+		self.updates += len(rows)
+		self._push()
+		return deltas
+
+	def episode_update(self, rows, rewards):
+		"""
+		Offline TD(lambda) update over a recorded episode: \a rows are the
+		T states it went through, \a rewards the T rewards of the moves
+		from each of them, the last one ending the episode. This is the sum
+		of the updates step() would make with the weights held fixed.
+		Returns the TD errors.
+		"""
+		self._pull()
+		rows = numpy.asarray(rows, dtype=float)
+		values = rows @ self.weights
+		next_values = numpy.append(values[1:], 0.)
+		deltas = numpy.asarray(rewards, dtype=float) + self.gamma * next_values - values
+		# Each state is credited with the later TD errors, decayed
+		decay = self.gamma * self.lambda_
+		credits = numpy.empty_like(deltas)
+		credit = 0.
+		for t in range(len(deltas) - 1, -1, -1):
+			credit = deltas[t] + decay * credit
+			credits[t] = credit
+		self.weights += self.alpha * (credits @ rows)
+		self.updates += len(rows)
+		self._push()
+		return deltas
+
+	def replay(self, batch_size=256, epochs=1):
+		"""
+		Learns again from the recorded transitions, by shuffled minibatches
+		of \a batch_size (see batch_update()).
+		"""
+		transitions = self.transitions
+		if not transitions:
+			return
+		zeros = numpy.zeros(len(FEATURES))
+		rows = numpy.array([row for row, reward, next_row in transitions])
+		rewards = numpy.array([reward for row, reward, next_row in transitions])
+		terminals = numpy.array([next_row is None for row, reward, next_row in transitions])
+		next_rows = numpy.array([zeros if next_row is None else next_row for row, reward, next_row in transitions])
+		for epoch in range(epochs):
+			order = numpy.random.permutation(len(transitions))
+			for start in range(0, len(order), batch_size):
+				batch = order[start:start + batch_size]
+				self.batch_update(rows[batch], rewards[batch], next_rows[batch], terminals[batch])
+
+# The TDLearner of TDLearningPlayer, learning _weights (None without NumPy)
+td_learner = TDLearner() if numpy is not None else None
 
 def incorporateFeedback(phi, vpi, vprimepi, reward):
 	for feature in set().union(_weights, phi):
@@ -398,31 +848,137 @@ def get_num_targets(game, moveIndex, playerIndex=0):
 def get_value_of_move(game, moveIndex, moveTarget=-1, playerIndex=0):
 	"""
 	Returns the V(s') of performing a given action on the current game state.
-	Does not modify the game state passed into the method.
+	The move is played on the game itself and rolled back afterwards, so
+	the game state passed into the method is left unchanged.
 	"""
-	game_copy = copy.deepcopy(game)
-	action_type, action_entity = get_action_by_index(game_copy, moveIndex, playerIndex)
-	if action_type == "CARD":
-		target = None
-		card = action_entity
-		if card.must_choose_one:
-			card = card.choose_cards[moveTarget]
-		if card.requires_target():
-			target = card.targets[moveTarget]
-		card.play(target=target)
-		game_copy.current_player.total_mana_spent += card.cost
-	elif action_type == "HEROPOWER":
-		heropower = game_copy.players[playerIndex].hero.power
-		if heropower.requires_target():
-			heropower.use(target=heropower.targets[moveTarget])
+	mark = game.mark()
+	try:
+		action_type, action_entity = get_action_by_index(game, moveIndex, playerIndex)
+		if action_type == "CARD":
+			target = None
+			card = action_entity
+			if card.must_choose_one:
+				card = card.choose_cards[moveTarget]
+			if card.requires_target():
+				target = card.targets[moveTarget]
+			card.play(target=target)
+			game.current_player.total_mana_spent += card.cost
+		elif action_type == "HEROPOWER":
+			heropower = game.players[playerIndex].hero.power
+			if heropower.requires_target():
+				heropower.use(target=heropower.targets[moveTarget])
+			else:
+				heropower.use()
+			game.current_player.total_mana_spent += 2
+		elif action_type == "ATTACK":
+			action_entity.attack(action_entity.targets[moveTarget])
 		else:
-			heropower.use()
-		game_copy.current_player.total_mana_spent += 2
-	elif action_type == "ATTACK":
-		action_entity.attack(action_entity.targets[moveTarget])
+			pass
+		return _cached_value(game.players[playerIndex], game)
+	finally:
+		game.rollback(mark)
+
+def _move_features(generator, move, seed, expectimax=False, samples=None):
+	"""
+	Returns the featureRow() of the player of a MoveGenerator after \a move
+	(counting the mana it spends, as get_value_of_move does), leaving the
+	game state unchanged. The random module is seeded from seed and the
+	move beforehand.
+	If \a expectimax is True, returns the expected row over the outcomes
+	of the chance events of the move instead (see chance.outcomes()).
+	"""
+	player = generator.player
+	game = player.game
+	source, choose, target = generator.entities[move]
+	if move.type == "CARD":
+		cost = (choose or source).cost
+	elif move.type == "HEROPOWER":
+		cost = 2
 	else:
-		pass
-	return approximateV(game_copy.players[playerIndex], game_copy)
+		cost = 0
+
+	def features():
+		if move.type != "END_TURN":
+			random.seed(_move_seed(seed, game.players.index(player), move))
+			generator.apply(move)
+			game.current_player.total_mana_spent += cost
+		return featureRow(player, game)
+
+	if expectimax:
+		ret = [0.] * len(FEATURES)
+		for probability, row in chance.outcomes(game, features, samples):
+			for i, x in enumerate(row):
+				ret[i] += probability * x
+		return ret
+	mark = game.mark()
+	try:
+		return features()
+	finally:
+		game.rollback(mark)
+
+def lookahead(generator, moves=None, pool=None, expectimax=False, samples=None):
+	"""
+	One-ply lookahead: returns the V(s') of the player of a MoveGenerator
+	after each of \a moves (every move of the generator by default), in order.
+	Each move is made on the game itself and rolled back, and all the
+	feature rows are evaluated at once by batchApproximateRows. If a
+	LookaheadPool is given, the moves are spread over its workers.
+	Random outcomes are seeded per move, so the values do not depend on
+	the pool; the random module is left as if only one number was drawn.
+	If \a expectimax is True, the values are expected over the outcomes of
+	the chance events of each move, with at most \a samples branches per
+	chance event if given (see chance.outcomes()); V is linear, so this
+	is the V of the expected feature row.
+	"""
+	if moves is None:
+		moves = generator.moves
+	seed = random.getrandbits(32)
+	random_state = random.getstate()
+	options = (expectimax, samples)
+	try:
+		if pool is not None:
+			rows = pool.features(generator, moves, seed, options)
+		else:
+			rows = [_move_features(generator, move, seed, *options) for move in moves]
+	finally:
+		random.setstate(random_state)
+	return batchApproximateRows(rows)
+
+
+class LookaheadPool:
+	"""
+	Computes the feature rows of lookahead() on a pool of \a workers
+	processes (one per CPU by default), \a chunksize moves at a time.
+	The state changes after every move, so the workers are forked again
+	for every lookahead of at least \a min_moves moves; smaller ones are
+	computed in this process instead.
+	NOTE: This requires a platform with the "fork" start method.
+	"""
+	def __init__(self, workers=None, chunksize=4, min_moves=16):
+		self.workers = workers or os.cpu_count()
+		self.chunksize = chunksize
+		self.min_moves = min_moves
+
+	def features(self, generator, moves, seed, options=()):
+		if self.workers < 2 or len(moves) < self.min_moves:
+			return [_move_features(generator, move, seed, *options) for move in moves]
+		import multiprocessing
+		context = multiprocessing.get_context("fork")
+		with context.Pool(self.workers, _init_lookahead_worker, (generator, seed, options)) as pool:
+			return pool.map(_lookahead_task, moves, self.chunksize)
+
+
+# The (generator, seed, options) a LookaheadPool worker makes moves with
+_lookahead_worker = None
+
+def _init_lookahead_worker(generator, seed, options):
+	global _lookahead_worker
+	_lookahead_worker = (generator, seed, options)
+
+
+def _lookahead_task(move):
+	generator, seed, options = _lookahead_worker
+	return _move_features(generator, move, seed, *options)
 
 def stringify_target_info(player, action_type, action_entity, targetIndex):
 	"""
@@ -440,12 +996,399 @@ def stringify_target_info(player, action_type, action_entity, targetIndex):
 		return str(action_entity.targets[targetIndex])
 	return "(none)"
 
+def _reacts_to_moves(entity):
+	return entity.events or entity.data.scripts.update
+
+
+def _looks_at_positions(obj, selector_type, seen):
+	if id(obj) in seen:
+		return False
+	seen.add(id(obj))
+	if isinstance(obj, selector_type):
+		return True
+	if isinstance(obj, (list, tuple)):
+		items = obj
+	elif isinstance(obj, dict):
+		items = obj.values()
+	elif type(obj).__module__.startswith("fireplace.") and hasattr(obj, "__dict__"):
+		items = vars(obj).values()
+	else:
+		return False
+	return any(_looks_at_positions(item, selector_type, seen) for item in items)
+
+
+# Card id -> whether playing the card can depend on board positions
+_positional_cards = {}
+
+
+def _positional(card):
+	"""
+	Returns True if playing \a card can depend on board positions, eg. buff
+	adjacent minions (as scripted in cards.db). Scripts written as functions
+	cannot be inspected and count as positional.
+	"""
+	ret = _positional_cards.get(card.id)
+	if ret is None:
+		from .dsl.selector import BoardPositionSelector
+		ret = False
+		for entity in [card] + list(card.choose_cards):
+			scripts = entity.data.scripts
+			for script in (scripts.play, scripts.combo, scripts.powered_up):
+				if callable(script) or _looks_at_positions(script, BoardPositionSelector, set()):
+					ret = True
+		_positional_cards[card.id] = ret
+	return ret
+
+
+def _quiet_board(game):
+	"""
+	Returns True if nothing in play or in hand can react to moves: no event
+	listeners, auras or secrets (as scripted in cards.db), and no card in hand
+	whose play looks at board positions, which the order of plays changes.
+	"""
+	for player in game.players:
+		if player.secrets:
+			return False
+		entities = list(player.live_entities) + list(player.buffs)
+		if player.hero and player.hero.power:
+			entities.append(player.hero.power)
+		for entity in entities:
+			if _reacts_to_moves(entity):
+				return False
+			for buff in getattr(entity, "buffs", ()):
+				if _reacts_to_moves(buff):
+					return False
+		for card in player.hand:
+			if card.data.scripts.Hand.events or card.data.scripts.Hand.update:
+				return False
+			if _positional(card):
+				return False
+	return True
+
+
+def _commuting_key(player, move, source, target, quiet):
+	"""
+	Returns the entity_id of the entity making a move if, the board being
+	quiet, the move commutes with every other move with a key: minion attacks
+	into a hero which does not hit back, and plays of minions without any
+	script in cards.db. Returns None for other moves.
+	Commuting plays only differ in the order of the minions on the board and
+	in the last card played, which none of the quiet cards look at.
+	"""
+	if not quiet:
+		return None
+	if move.type == "ATTACK":
+		if source.type == CardType.MINION and target is player.opponent.hero and not target.atk:
+			return move.source
+	elif move.type == "CARD":
+		if source.type == CardType.MINION and move.target is None and move.choose is None:
+			scripts = source.data.scripts
+			if scripts.__bases__ == (object, ) and not scripts.events:
+				return move.source
+	return None
+
+
+def _move_commuting_key(game, player_index, move):
+	player = game.players[player_index]
+	source, choose, target = resolve(player, move)
+	return _commuting_key(player, move, source, target, _quiet_board(game))
+
+
+def _skip_commuting(key, last_key):
+	"""
+	Moves which commute with the previous move of the chain are only made in
+	increasing key order, so that the other orders are never explored.
+	"""
+	return key is not None and last_key is not None and key < last_key
+
+
 epsilon = 0
 def setEpsilon(eVal):
 	global epsilon
 	epsilon = eVal
 
 
+# Whether the agents only expand one of each group of equivalent moves
+unique_moves = True
+
+# If set, the agents only consider the attacks starting one of the best
+# attack_planning plans of attack_plans(), instead of every attack
+attack_planning = None
+
+# If set, the agents only consider the card and hero power moves of one of
+# the best turn_planning plans of turn_plans(), instead of every such move
+turn_planning = None
+
+def _move_generator(player):
+	generator = MoveGenerator(player, unique_moves)
+	if turn_planning and any(move.type in ("CARD", "HEROPOWER") for move in generator.moves):
+		planned = {move for value, plan in turn_plans(player, turn_planning) for move in plan}
+		generator.moves = [move for move in generator.moves if move.type not in ("CARD", "HEROPOWER") or move in planned]
+	if attack_planning and any(move.type == "ATTACK" for move in generator.moves):
+		starts = {plan[0] for value, plan in attack_plans(player, attack_planning) if plan}
+		generator.moves = [move for move in generator.moves if move.type != "ATTACK" or move in starts]
+	return generator
+
+
+def _value_delta(player, change):
+	"""
+	Returns the approximateV difference change() makes for \a player,
+	leaving the game state unchanged.
+	"""
+	game = player.game
+	before = approximateV(player, game)
+	mark = game.mark()
+	try:
+		change()
+		return approximateV(player, game) - before
+	finally:
+		game.rollback(mark)
+
+
+def _hit_hero(hero):
+	hero.damage += 1
+
+
+class _Combatant:
+	"""
+	The combat stats of a character in the arithmetic model of attack_plans().
+	"""
+	def __init__(self, character, value):
+		self.character = character
+		self.hero = character.type == CardType.HERO
+		self.atk = character.atk
+		self.health = character.health + getattr(character, "armor", 0)
+		self.shield = bool(getattr(character, "divine_shield", False))
+		self.poisonous = bool(getattr(character, "poisonous", False))
+		self.taunt = bool(getattr(character, "taunt", False))
+		# approximateV gained when it dies (or per point of damage, for heroes)
+		self.value = value
+
+	def take(self, attacker, amount):
+		"""
+		Deals \a amount damage from \a attacker, returning the damage done
+		and a function undoing it.
+		"""
+		health, shield = self.health, self.shield
+
+		def undo():
+			self.health, self.shield = health, shield
+
+		if amount <= 0:
+			return 0, undo
+		if self.shield:
+			self.shield = False
+			return 0, undo
+		if attacker.poisonous and not self.hero:
+			self.health = 0
+		else:
+			self.health -= amount
+		return amount, undo
+
+	@property
+	def dead(self):
+		return self.health <= 0
+
+
+def attack_plans(player, count=3):
+	"""
+	Returns up to \a count (value, moves) attack plans for \a player, best
+	first, moves being the ATTACK moves of the plan in order.
+	The assignment of attackers (once per attack left, for windfury) to
+	targets is solved by branch and bound over an arithmetic model of
+	combat which accounts for taunts, divine shields and poisonous (bounded
+	only under a LinearEvaluator). Plans are scored by the approximateV
+	difference of the minions killed and lost and of the damage to the
+	heroes, each measured once on the real state. The best plans of the model are then made on the real state,
+	and the ones which could not be made are dropped; values are the
+	approximateV differences they made. Not attacking is always a plan.
+	"""
+	opponent = player.opponent
+	enemies = []
+	for character in opponent.characters:
+		if not character.attackable or getattr(character, "stealthed", False):
+			continue
+		if character.type == CardType.HERO:
+			enemies.append(_Combatant(character, _value_delta(player, lambda: _hit_hero(character))))
+		else:
+			enemies.append(_Combatant(character, _value_delta(player, character.destroy)))
+	attackers = []
+	for character in player.characters:
+		if not character.can_attack():
+			continue
+		if character.type == CardType.HERO:
+			value = _value_delta(player, lambda: _hit_hero(character))
+		else:
+			value = _value_delta(player, character.destroy)
+		attackers.append(_Combatant(character, value))
+	attackers.sort(key=lambda attacker: -attacker.atk)
+	slots = []
+	for attacker in attackers:
+		character = attacker.character
+		slots += [attacker] * (character.max_attacks - character.num_attacks)
+
+	# The most a slot can add, for the bound
+	best_gains = []
+	for attacker in slots:
+		gain = 0
+		for enemy in enemies:
+			if enemy.hero:
+				if not getattr(attacker.character, "cannot_attack_heroes", False):
+					gain = max(gain, enemy.value * attacker.atk)
+			else:
+				gain = max(gain, enemy.value)
+		best_gains.append(gain)
+	remaining_gains = [sum(best_gains[i:]) for i in range(len(slots) + 1)]
+	# The bound assumes that losing an attacker never adds value, which
+	# only the weights of a LinearEvaluator are checked for: plans are not
+	# pruned under other evaluators (eg. MLPEvaluator)
+	bounded = isinstance(evaluator, LinearEvaluator) and all(attacker.value <= 0 for attacker in attackers)
+
+	candidates = count * 2
+	# Outcome of the plan -> (value, plan), for the best plans of the model
+	plans = {}
+	# The value a plan needs to be kept, once there are enough of them
+	threshold = [float("-inf")]
+	taunts = [enemy for enemy in enemies if enemy.taunt]
+
+	def search(i, value, plan):
+		if bounded and value + remaining_gains[i] <= threshold[0]:
+			return
+		if i == len(slots):
+			if any(not enemy.taunt for attacker, enemy in plan) and any(not t.dead for t in taunts):
+				return
+			outcome = tuple((e.health, e.shield) for e in enemies) + tuple((a.health, a.shield) for a in attackers)
+			if outcome in plans and plans[outcome][0] >= value:
+				return
+			plans[outcome] = (value, plan)
+			if len(plans) > candidates:
+				del plans[min(plans, key=lambda k: plans[k][0])]
+			if len(plans) == candidates:
+				threshold[0] = min(value for value, plan in plans.values())
+			return
+		attacker = slots[i]
+		if attacker.dead:
+			return search(i + 1, value, plan)
+		for enemy in enemies:
+			if enemy.dead:
+				continue
+			if enemy.hero and getattr(attacker.character, "cannot_attack_heroes", False):
+				continue
+			damage, undo_enemy = enemy.take(attacker, attacker.atk)
+			if enemy.hero:
+				gain = enemy.value * damage
+				counter, undo_attacker = 0, lambda: None
+			else:
+				gain = enemy.value if enemy.dead else 0
+				counter, undo_attacker = attacker.take(enemy, enemy.atk)
+			if attacker.hero:
+				gain += attacker.value * counter
+			elif attacker.dead:
+				gain += attacker.value
+			if not (attacker.hero and attacker.dead):
+				search(i + 1, value + gain, plan + [(attacker, enemy)])
+			undo_attacker()
+			undo_enemy()
+		search(i + 1, value, plan)
+
+	search(0, 0., [])
+
+	ret = []
+	best = sorted(plans.values(), key=lambda plan: -plan[0])[:candidates]
+	for model_value, plan in best:
+		# Attacks on taunts first, as the model allows them in any order
+		plan = sorted(plan, key=lambda attack: not attack[1].taunt)
+		moves = [
+			Move("ATTACK", attacker.character.entity_id, None, enemy.character.entity_id)
+			for attacker, enemy in plan
+		]
+		try:
+			value = _value_delta(player, lambda: [apply_move(player, move) for move in moves])
+		except InvalidAction:
+			continue
+		ret.append((value, moves))
+	ret.sort(key=lambda plan: -plan[0])
+	return ret[:count]
+
+
+def _move_cost(move, source, choose):
+	if move.type == "CARD":
+		return (choose or source).cost
+	elif move.type == "HEROPOWER":
+		return source.cost
+	return 0
+
+
+def _pareto_spends(items, mana):
+	"""
+	Knapsack over the (cost, value, move) \a items: returns the
+	(cost, value, moves) subsets within \a mana which no other subset
+	beats with as much mana or less, cheapest first.
+	"""
+	frontier = [(0, 0., [])]
+	for cost, value, move in items:
+		spends = frontier + [
+			(spent + cost, total + value, moves + [move])
+			for spent, total, moves in frontier if spent + cost <= mana
+		]
+		spends.sort(key=lambda spend: (spend[0], -spend[1]))
+		frontier = []
+		for spend in spends:
+			if not frontier or spend[1] > frontier[-1][1]:
+				frontier.append(spend)
+	return frontier
+
+
+def turn_plans(player, count=3):
+	"""
+	Returns up to \a count (value, moves) plans of the cards and hero power
+	\a player can play this turn, best first, moves being the CARD and
+	HEROPOWER moves of the plan in order.
+	Each playable card (and the hero power) is given its best move by a
+	one-ply lookahead, and the subsets of them worth playing are the
+	Pareto-optimal ones in (mana spent, sum of values), found by a
+	knapsack over the mana available. The best of them are then made on
+	the real state, and the ones which could not be made (eg. a full board
+	or a target killed by an earlier card) are dropped; values are the
+	approximateV differences they made. Playing nothing is always a plan.
+	NOTE: Cards are counted at their cost, without the mana they give.
+	"""
+	game = player.game
+	# Every copy of a card can be part of a plan
+	generator = MoveGenerator(player)
+	moves = [move for move in generator.moves if move.type in ("CARD", "HEROPOWER")]
+	if not moves:
+		return [(0., [])]
+	before = approximateV(player, game)
+	# Source -> (cost, value, move) of its best move
+	best = {}
+	for move, value in zip(moves, lookahead(generator, moves)):
+		source, choose, target = generator.entities[move]
+		if move.source not in best or value - before > best[move.source][1]:
+			best[move.source] = (_move_cost(move, source, choose), value - before, move)
+	spends = _pareto_spends(list(best.values()), player.mana)
+
+	ret = []
+	for spent, model_value, plan in sorted(spends, key=lambda spend: -spend[1])[:count * 2]:
+
+		def play():
+			for move in plan:
+				source, choose, target = resolve(player, move)
+				cost = _move_cost(move, source, choose)
+				ended = apply_move(player, move)
+				player.total_mana_spent += cost
+				if ended:
+					break
+
+		try:
+			value = _value_delta(player, play)
+		except InvalidAction:
+			continue
+		ret.append((value, plan))
+	ret.sort(key=lambda plan: -plan[0])
+	return ret[:count]
+
+
 def perform_action(game, player_index, action_index, target_index):
 	"""
 	Performs the given action on the current game state and modifies it.
@@ -478,13 +1421,54 @@ def perform_action(game, player_index, action_index, target_index):
 	else:
 		return False
 
-def minimaxGetBestAction(player_index, game_orig, depth, indent):
+def minimaxGetBestAction(player_index, game_orig, depth, indent, persistent=False, table=None, pool=None, budget=None,
+	lazy=False, max_chains=None):
 	"""
 	Performs a beam search with K = 3 over the current game state with the given
 	depth. The indent parameter should initially be "" and makes it easier for debug
 	purposes to visualise the call stack.
+	If persistent is True, the states of the action chains are not copied but kept
+	as the changes made on top of game_orig (see BaseGame.snapshot()), which is
+	left unchanged once the search is done.
+	If a zobrist.TranspositionTable is given, searched states are looked up in it
+	before being expanded or evaluated, and action chains reaching a state already
+	reached by another chain (eg. the same attacks in another order) are dropped.
+	If a FrontierPool is given, the frontiers of the search are expanded on it.
+	If a SearchBudget is given, SearchAborted is raised once it runs out; the
+	game state is left unchanged in that case too.
+	If lazy is True, action chains only keep their actions (and state hash, with
+	a table) instead of a state, and states are rebuilt by replaying actions from
+	game_orig: this is the search of a FrontierPool(1) (see FrontierPool).
+	Only the 3 completed chains recursed into are kept. If max_chains is given,
+	only the max_chains partial chains with the best predicted values are kept
+	(per frontier with a pool), which bounds the memory used by wide boards at
+	the cost of an approximate search once the bound is hit.
 	Returns a (predicted_V, action_list) tuple to the caller.
 	"""
+	if lazy and pool is None:
+		pool = FrontierPool(1)
+	if pool is not None:
+		return pool.search(player_index, game_orig, depth, indent, table, budget, max_chains)
+	if table is None and value_cache is None:
+		return _minimax_search(player_index, game_orig, depth, indent, persistent, None, budget, max_chains)
+	from . import zobrist
+	zobrist.start()
+	try:
+		if table is None:
+			return _minimax_search(player_index, game_orig, depth, indent, persistent, None, budget, max_chains)
+		key = game_orig.state_hash() ^ zobrist.side_key(player_index)
+		ret = table.lookup(key, depth)
+		if ret is not None:
+			print(indent + "Transposition table hit for player_index " + str(player_index) + " and depth " + str(depth))
+			return ret
+		ret = _minimax_search(player_index, game_orig, depth, indent, persistent, table, budget, max_chains)
+		table.store(key, depth, ret)
+		return ret
+	finally:
+		zobrist.stop()
+
+
+def _minimax_search(player_index, game_orig, depth, indent, persistent, table, budget, max_chains):
 	print(indent + "Entering minimax for player_index " + str(player_index) + " and depth " + str(depth))
 	if game_orig.ended:
 		if game_orig.loser == game_orig.players[1]:
@@ -492,206 +1476,1090 @@ def minimaxGetBestAction(player_index, game_orig, depth, indent):
 		else:
 			return (-200., None)
 	elif depth == 0:
-		return (approximateV(game_orig.players[player_index], game_orig), None)
+		return (_cached_value(game_orig.players[player_index], game_orig), None)
+
+	if persistent:
+		# Every state is rolled back to this mark, so game_orig is left unchanged
+		game = game_orig
+		root = game.mark()
+	else:
+		# Make a copy since we do not want to modify the original game state
+		# nor the game state from the previous recursive call
+		game = game_orig.clone()
+
+	try:
+		# List of (approximateV, action_chain, game_state) tuples, see _add_completed_chain
+		# In persistent mode, game_state is a journal.Delta (None for the root state)
+		completed_action_chains = []
+		num_completed = 0
+		# (Hash, commuting key) of the states reached so far, when using a transposition table
+		reached = set()
+		# Partial chains also hold the commuting key of their last move (see _commuting_key)
+		partial_action_chains = [(_cached_value(game.players[0], game), [], None if persistent else game, None)]
+
+		print(indent + "Exploring all action chains for player_index " + str(player_index) + " and depth " + str(depth))
+		while partial_action_chains:
+			current_value, prev_actions, chain_state, last_key = partial_action_chains.pop(0)
+			if persistent:
+				chain_mark = game.mark()
+				if chain_state is not None:
+					game.restore(chain_state)
+				chain_game = game
+			else:
+				chain_game = chain_state
+			generator = _move_generator(chain_game.players[player_index])
+			quiet = _quiet_board(chain_game)
+			num_children = 0
+			for move in generator:
+				source, choose, target = generator.entities[move]
+				key = _commuting_key(generator.player, move, source, target, quiet)
+				if _skip_commuting(key, last_key):
+					continue
+				if persistent:
+					action_mark = game.mark()
+					chain_game_copy = game
+					game_or_turn_just_ended = generator.apply(move)
+				else:
+					chain_game_copy = chain_game.clone()
+					game_or_turn_just_ended = apply_move(chain_game_copy.players[player_index], move)
+				num_children += 1
+				if table is not None:
+					state_hash = chain_game_copy.state_hash()
+					if (state_hash, key) in reached:
+						# Transposition of a chain explored already
+						if persistent:
+							game.rollback(action_mark)
+						continue
+					reached.add((state_hash, key))
+				if chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[1]:
+					predicted_value = 200.
+				elif chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[0]:
+					predicted_value = -200.
+				elif table is not None:
+					predicted_value = _tt_value(chain_game_copy, state_hash, table)
+				else:
+					predicted_value = _cached_value(chain_game_copy.players[0], chain_game_copy)
+				new_actions = prev_actions[:]
+				new_actions.append(move)
+				if persistent:
+					new_state = game.snapshot(action_mark, chain_state)
+					game.rollback(action_mark)
+				else:
+					new_state = chain_game_copy
+				if game_or_turn_just_ended:
+					_add_completed_chain(completed_action_chains, (predicted_value, new_actions, new_state), player_index)
+					num_completed += 1
+				else:
+					partial_action_chains.append((predicted_value, new_actions, new_state, key))
+			partial_action_chains = _cap_chains(partial_action_chains, max_chains, player_index)
+			if persistent:
+				game.rollback(chain_mark)
+			if budget is not None:
+				# Between chains, so that no mark is left open when aborting
+				budget.tick(num_children)
+
+		print(indent + "completed_action_chains has length " + str(num_completed))
+
+		# Explore best/worst 3 paths from completed_action_chains
+		if player_index == 0:
+			best_paths = completed_action_chains
+			best_chain = None
+			max_value = float("-inf")
+			for chain in best_paths:
+				print(indent + "Player " + str(player_index) + " at depth " + str(depth) + " - current estimate " + str(chain[0]) + " (actions " + str(chain[1]) + ")")
+				est_value = _minimax_chain_value(game, chain[2], 1, depth, indent + "  ", persistent, table, budget, max_chains)
+				if est_value > max_value:
+					max_value = est_value
+					best_chain = chain[1]
+			return (max_value, best_chain)
+		else:
+			worst_paths = completed_action_chains
+			print(indent + "Minimising player worst action chains have predicted value:")
+			worst_chain = None
+			min_value = float("+inf")
+			for chain in worst_paths:
+				print(indent + "Player " + str(player_index) + " at depth " + str(depth) + " - current estimate " + str(chain[0]) + " (actions " + str(chain[1]) + ")")
+				est_value = _minimax_chain_value(game, chain[2], 0, depth - 1, indent + "  ", persistent, table, budget, max_chains)
+				if est_value < min_value:
+					min_value = est_value
+					worst_chain = chain[1]
+			return (min_value, worst_chain)
+	finally:
+		if persistent:
+			game.rollback(root)
+
+
+def _minimax_chain_value(game, chain_state, player_index, depth, indent, persistent, table, budget, max_chains):
+	"""
+	Recurses into minimaxGetBestAction from the state a completed action chain led to.
+	"""
+	if not persistent:
+		return minimaxGetBestAction(player_index, chain_state, depth, indent, table=table, budget=budget, max_chains=max_chains)[0]
+	mark = game.mark()
+	try:
+		game.restore(chain_state)
+		return minimaxGetBestAction(player_index, game, depth, indent, persistent, table, budget=budget, max_chains=max_chains)[0]
+	finally:
+		game.rollback(mark)
+
+
+def _add_completed_chain(chains, chain, player_index):
+	"""
+	Adds a completed (predicted_V, ...) action chain to chains, which only
+	keeps the 3 chains the beam search recurses into, in order: the lowest
+	predicted values for the first player (earlier chains first on ties),
+	the highest ones for the second player (later chains first on ties).
+	"""
+	value = chain[0]
+	for index, other in enumerate(chains):
+		if (other[0] > value) if player_index == 0 else (other[0] <= value):
+			break
+	else:
+		index = len(chains)
+	chains.insert(index, chain)
+	del chains[3:]
+
+
+def _cap_chains(chains, max_chains, player_index):
+	"""
+	Returns the max_chains (predicted_V, ...) partial action chains with the
+	best predicted values for player_index, in their order in chains.
+	"""
+	if max_chains is None or len(chains) <= max_chains:
+		return chains
+	best = sorted(range(len(chains)), key=lambda i: chains[i][0], reverse=player_index == 0)[:max_chains]
+	return [chains[i] for i in sorted(best)]
+
+
+def _tt_value(game, state_hash, table):
+	"""
+	Returns approximateV for the first player, looking it up in the
+	transposition table first (the same entry as a depth 0 search).
+	"""
+	from . import zobrist
+	key = state_hash ^ zobrist.side_key(0)
+	ret = table.lookup(key, 0)
+	if ret is None:
+		ret = (_cached_value(game.players[0], game), None)
+		table.store(key, 0, ret)
+	return ret[0]
+
+
+class FrontierPool:
+	"""
+	Expands the frontiers of minimaxGetBestAction on a pool of \a workers
+	processes (one per CPU by default). Action chains are sent to the workers
+	\a chunksize at a time; frontiers smaller than \a min_frontier are expanded
+	in this process instead.
+	Each chain is replayed from the root state, with the random module seeded
+	from the search seed and the actions leading to every action played. The
+	result therefore does not depend on the number of workers nor on the chunk
+	size, and FrontierPool(workers=1) is the serial version of the search.
+	NOTE: Workers are forked from the searching process, so this requires a
+	platform with the "fork" start method.
+	"""
+	def __init__(self, workers=None, chunksize=4, min_frontier=8):
+		self.workers = workers or os.cpu_count()
+		self.chunksize = chunksize
+		self.min_frontier = min_frontier
+		self.seed = None
+		self.hashed = False
+		self._pool = None
+
+	def search(self, player_index, game, depth, indent, table=None, budget=None, max_chains=None):
+		"""
+		Runs minimaxGetBestAction from \a game, which is left unchanged.
+		The random module is left in the same state whatever the pool size.
+		"""
+		from . import zobrist
+		self.seed = random.getrandbits(32)
+		self.hashed = table is not None
+		random_state = random.getstate()
+		if self.hashed:
+			# Workers inherit the hash of the root state, see zobrist.py
+			zobrist.start()
+			game.state_hash()
+		try:
+			if self.workers > 1:
+				import multiprocessing
+				context = multiprocessing.get_context("fork")
+				self._pool = context.Pool(self.workers, _init_frontier_worker, (game, self.seed, self.hashed))
+			return _minimax_parallel(player_index, game, [], depth, indent, self, table, budget, max_chains)
+		finally:
+			if self._pool is not None:
+				self._pool.terminate()
+				self._pool = None
+			if self.hashed:
+				zobrist.stop()
+			random.setstate(random_state)
+
+	def expand(self, game, tasks):
+		"""
+		Returns the children of each (path, player_index) task, in order.
+		"""
+		if self._pool is None or len(tasks) < self.min_frontier:
+			return [_expand_path(game, self.seed, path, player_index, self.hashed) for path, player_index in tasks]
+		return self._pool.map(_expand_frontier_task, tasks, self.chunksize)
+
+
+# The (game, seed, hashed) a FrontierPool worker expands paths from
+_frontier_worker = None
+
+def _init_frontier_worker(game, seed, hashed):
+	global _frontier_worker
+	_frontier_worker = (game, seed, hashed)
+
+
+def _expand_frontier_task(task):
+	game, seed, hashed = _frontier_worker
+	path, player_index = task
+	return _expand_path(game, seed, path, player_index, hashed)
+
+
+def _move_seed(seed, player_index, move):
+	# Entity ids rather than the move itself, whose hash varies between runs
+	return hash((seed, player_index, move.source or 0, move.choose or 0, move.target or 0))
+
+
+def _replay(game, seed, path):
+	"""
+	Makes the (player_index, move) moves of path, seeding the random
+	module before each one. Returns the seed for the next move.
+	"""
+	for player_index, move in path:
+		seed = _move_seed(seed, player_index, move)
+		random.seed(seed)
+		apply_move(game.players[player_index], move)
+	return seed
+
+
+def _predicted_value(game):
+	if game.ended:
+		return 200. if game.loser == game.players[1] else -200.
+	return approximateV(game.players[0], game)
 
-	# Make a deep copy since we do not want to modify the original game state
-	# nor the game state from the previous recursive call
-	game = copy.deepcopy(game_orig)
 
-	# List of (approximateV, action_chain, game_state) tuples
+def _expand_path(game, seed, path, player_index, hashed):
+	"""
+	Replays path on game and tries every move player_index can make from
+	there. Returns a (predicted_V, move, turn_ended, state_hash) tuple per
+	move. The game is left unchanged.
+	"""
+	children = []
+	mark = game.mark()
+	try:
+		seed = _replay(game, seed, path[:-1])
+		last_key = None
+		if path and path[-1][0] == player_index:
+			last_key = _move_commuting_key(game, *path[-1])
+		seed = _replay(game, seed, path[-1:])
+		generator = _move_generator(game.players[player_index])
+		quiet = _quiet_board(game)
+		for move in generator:
+			source, choose, target = generator.entities[move]
+			key = _commuting_key(generator.player, move, source, target, quiet)
+			if _skip_commuting(key, last_key):
+				continue
+			action_mark = game.mark()
+			random.seed(_move_seed(seed, player_index, move))
+			game_or_turn_just_ended = generator.apply(move)
+			# Chains only transpose if their next moves are restricted the same way
+			state_hash = (game.state_hash(), key) if hashed else None
+			children.append((_predicted_value(game), move, game_or_turn_just_ended, state_hash))
+			game.rollback(action_mark)
+	finally:
+		game.rollback(mark)
+	return children
+
+
+def _minimax_parallel(player_index, game, path, depth, indent, pool, table, budget, max_chains):
+	"""
+	minimaxGetBestAction from the state path leads to, expanding each frontier
+	of the beam search at once on a FrontierPool. States are kept as paths from
+	the root game, which is left unchanged.
+	"""
+	from . import zobrist
+	print(indent + "Entering minimax for player_index " + str(player_index) + " and depth " + str(depth))
+	mark = game.mark()
+	try:
+		_replay(game, pool.seed, path)
+		if game.ended or depth == 0:
+			if game.ended:
+				return (200. if game.loser == game.players[1] else -200., None)
+			return (approximateV(game.players[player_index], game), None)
+		root_value = approximateV(game.players[0], game)
+		key = game.state_hash() ^ zobrist.side_key(player_index) if table is not None else None
+	finally:
+		game.rollback(mark)
+
+	if table is not None:
+		ret = table.lookup(key, depth)
+		if ret is not None:
+			print(indent + "Transposition table hit for player_index " + str(player_index) + " and depth " + str(depth))
+			return ret
+
+	# List of (approximateV, action_chain, state_hash) tuples, see _add_completed_chain
 	completed_action_chains = []
-	partial_action_chains = [(approximateV(game.players[0], game), [], game)]
+	num_completed = 0
+	reached = set()
+	# List of (approximateV, action_chain) tuples
+	partial_action_chains = [(root_value, [])]
 
 	print(indent + "Exploring all action chains for player_index " + str(player_index) + " and depth " + str(depth))
 	while partial_action_chains:
-		current_value, prev_actions, chain_game = partial_action_chains.pop(0)
-		available_actions = get_all_available_actions(chain_game.players[player_index])
-		for i in range(len(available_actions)):
-			num_targets = get_num_targets(chain_game, i, player_index)
-			if num_targets == -1:
-				chain_game_copy = copy.deepcopy(chain_game)
-				game_or_turn_just_ended = perform_action(chain_game_copy, player_index, i, -1)
+		tasks = [(path + [(player_index, move) for move in actions], player_index) for _, actions in partial_action_chains]
+		results = pool.expand(game, tasks)
+		if budget is not None:
+			budget.tick(sum(len(children) for children in results))
+		frontier = zip(partial_action_chains, results)
+		partial_action_chains = []
+		for (_, prev_actions), children in frontier:
+			for predicted_value, action, game_or_turn_just_ended, state_hash in children:
+				if table is not None:
+					if state_hash in reached:
+						continue
+					reached.add(state_hash)
+				new_actions = prev_actions[:]
+				new_actions.append(action)
 				if game_or_turn_just_ended:
-					if chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[1]:
-						predicted_value = 200.
-					elif chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[0]:
-						predicted_value = -200.
-					else:
-						predicted_value = approximateV(chain_game_copy.players[0], chain_game_copy)
-					new_actions = copy.deepcopy(prev_actions)
-					new_actions.append((i, -1))
-					completed_action_chains.append((predicted_value, new_actions, chain_game_copy))
+					_add_completed_chain(completed_action_chains, (predicted_value, new_actions, state_hash), player_index)
+					num_completed += 1
 				else:
-					predicted_value = approximateV(chain_game_copy.players[0], chain_game_copy)
-					new_actions = copy.deepcopy(prev_actions)
-					new_actions.append((i, -1))
-					partial_action_chains.append((predicted_value, new_actions, chain_game_copy))
-
-			else:
-				for t in range(num_targets):
-					chain_game_copy = copy.deepcopy(chain_game)
-					game_or_turn_just_ended = perform_action(chain_game_copy, player_index, i, t)
-					if game_or_turn_just_ended:
-						if chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[1]:
-							predicted_value = 200.
-						elif chain_game_copy.ended and chain_game_copy.loser == chain_game_copy.players[0]:
-							predicted_value = -200.
-						else:
-							predicted_value = approximateV(chain_game_copy.players[0], chain_game_copy)
-						new_actions = copy.deepcopy(prev_actions)
-						new_actions.append((i, t))
-						completed_action_chains.append((predicted_value, new_actions, chain_game_copy))
-					else:
-						predicted_value = approximateV(chain_game_copy.players[0], chain_game_copy)
-						new_actions = copy.deepcopy(prev_actions)
-						new_actions.append((i, t))
-						partial_action_chains.append((predicted_value, new_actions, chain_game_copy))
+					partial_action_chains.append((predicted_value, new_actions))
+		partial_action_chains = _cap_chains(partial_action_chains, max_chains, player_index)
 
-	print(indent + "completed_action_chains has length " + str(len(completed_action_chains)))
+	print(indent + "completed_action_chains has length " + str(num_completed))
 
-	# Explore best/worst 3 paths from completed_action_chains
 	if player_index == 0:
-		best_paths = sorted(completed_action_chains)[:3]
-		best_chain = None
-		max_value = float("-inf")
-		for chain in best_paths:
-			print(indent + "Player " + str(player_index) + " at depth " + str(depth) + " - current estimate " + str(chain[0]) + " (actions " + str(chain[1]) + ")")
-			est_value, _ = minimaxGetBestAction(1, chain[2], depth, indent + "  ")
-			if est_value > max_value:
-				max_value = est_value
-				best_chain = chain[1]
-		return (max_value, best_chain)
+		next_player, next_depth, best = 1, depth, max
 	else:
-		worst_paths = sorted(completed_action_chains)[-1:-4:-1]
-		print(indent + "Minimising player worst action chains have predicted value:")
-		worst_chain = None
-		min_value = float("+inf")
-		for chain in worst_paths:
-			print(indent + "Player " + str(player_index) + " at depth " + str(depth) + " - current estimate " + str(chain[0]) + " (actions " + str(chain[1]) + ")")
-			est_value, _ = minimaxGetBestAction(0, chain[2], depth - 1, indent + "  ")
-			if est_value < min_value:
-				min_value = est_value
-				worst_chain = chain[1]
-		return (min_value, worst_chain)
-
-def minimaxPlayer(player, game):
+		next_player, next_depth, best = 0, depth - 1, min
+	values = []
+	for chain in completed_action_chains:
+		print(indent + "Player " + str(player_index) + " at depth " + str(depth) + " - current estimate " + str(chain[0]) + " (actions " + str(chain[1]) + ")")
+		chain_path = path + [(player_index, move) for move in chain[1]]
+		values.append((_minimax_parallel(next_player, game, chain_path, next_depth, indent + "  ", pool, table, budget, max_chains)[0], chain[1]))
+	# The first of the best chains wins ties, as in the serial search
+	ret = best(values, key=lambda value: value[0]) if values else (float("-inf") if player_index == 0 else float("+inf"), None)
+	if table is not None:
+		table.store(key, depth, ret)
+	return ret
+
+
+class SearchBudget:
+	"""
+	Limits a search to a wall-clock \a deadline (as returned by time.time())
+	and/or a number of nodes (actions tried). tick() raises SearchAborted
+	once either runs out; searches only tick between action chains.
+	"""
+	def __init__(self, deadline=None, max_nodes=None):
+		self.deadline = deadline
+		self.max_nodes = max_nodes
+		self.nodes = 0
+
+	def tick(self, nodes=1):
+		self.nodes += nodes
+		if self.max_nodes is not None and self.nodes > self.max_nodes:
+			raise SearchAborted("Node budget of %i exhausted" % (self.max_nodes))
+		if self.deadline is not None and time.time() >= self.deadline:
+			raise SearchAborted("Deadline reached after %i nodes" % (self.nodes))
+
+
+def _greedy_action_chain(game, player_index):
+	"""
+	Returns the (predicted_V, action_list) of the chain which greedily
+	takes the move with the best lookahead() value until ending the turn.
+	"""
+	mark = game.mark()
+	try:
+		actions = []
+		while True:
+			generator = _move_generator(game.players[player_index])
+			values = lookahead(generator)
+			best_value = max(values)
+			best_move = generator.moves[values.index(best_value)]
+			actions.append(best_move)
+			if generator.apply(best_move):
+				return (best_value, actions)
+	finally:
+		game.rollback(mark)
+
+
+class AlphaBetaSearch:
+	"""
+	Depth-first alpha-beta search over single actions, for both players.
+	Values are approximateV of the first player, as in minimaxGetBestAction,
+	and depth counts turns the same way (depth 1 = our turn, then theirs).
+	Moves are tried lethal attacks first, then killer moves (which caused a
+	cutoff at the same ply), favourable trades, other attacks and cards by
+	mana cost, ordered by a history table within each class.
+	Nodes whose approximateV is worse than the current bound by more than
+	futility_margin only consider ending the turn.
+	States are explored with journal marks, and an optional
+	zobrist.TranspositionTable (not shared with minimaxGetBestAction, whose
+	entries differ) and SearchBudget can be given.
+	Killer and history tables persist across searches, which helps
+	iterative deepening.
+	"""
+	EXACT, LOWER, UPPER = range(3)
+
+	def __init__(self, table=None, budget=None, futility_margin=5.):
+		self.table = table
+		self.budget = budget
+		self.futility_margin = futility_margin
+		self.killers = collections.defaultdict(list)
+		self.history = collections.defaultdict(int)
+		self.nodes = 0
+		self.cutoffs = 0
+
+	def search(self, player_index, game, depth):
+		"""
+		Returns a (predicted_V, action_list) tuple, action_list being the
+		moves of player_index until the end of the turn.
+		"""
+		from . import zobrist
+		hashed = self.table is not None or value_cache is not None
+		if hashed:
+			zobrist.start()
+		try:
+			value, pv = self._search(game, 2 * depth - player_index, 0, float("-inf"), float("+inf"))
+		finally:
+			if hashed:
+				zobrist.stop()
+		actions = []
+		for move_player, move in pv:
+			if move_player != player_index:
+				break
+			actions.append(move)
+		return (value, actions or None)
+
+	def _ordered_moves(self, game, player_index, ply, last_key):
+		"""
+		Returns the MoveGenerator of player_index and its (score, move,
+		commuting_key) moves, best first.
+		"""
+		generator = _move_generator(game.players[player_index])
+		player = generator.player
+		opponent_hero = player.opponent.hero
+		killers = self.killers[ply]
+		quiet = _quiet_board(game)
+		moves = []
+		for move in generator:
+			entity, choose, target = generator.entities[move]
+			commuting_key = _commuting_key(player, move, entity, target, quiet)
+			if _skip_commuting(commuting_key, last_key):
+				continue
+			if move.type == "ATTACK":
+				if target is opponent_hero:
+					lethal = entity.atk >= target.health + target.armor
+					score = 4000 if lethal else 2000 + entity.atk
+				elif entity.atk >= target.health and target.atk < entity.health:
+					score = 2000 + target.atk + target.health
+				else:
+					score = 1000
+			elif move.type == "CARD":
+				score = 1000 + 10 * entity.cost
+			elif move.type == "HEROPOWER":
+				score = 1000
+			else:
+				score = 0
+			# Moves are keyed by entity ids, so they are the same at every node
+			if move in killers:
+				score += 3000
+			moves.append((score + self.history[move], move, commuting_key))
+		moves.sort(key=lambda move: -move[0])
+		return generator, moves
+
+	def _search(self, game, turns, ply, alpha, beta, last_key=None):
+		if game.ended:
+			return (200. if game.loser == game.players[1] else -200., [])
+		if turns <= 0:
+			return (_cached_value(game.players[0], game), [])
+
+		key = None
+		if self.table is not None and last_key is None:
+			# Nodes after a commuting move only search some of the moves
+			key = game.state_hash()
+			entry = self.table.lookup(key, turns)
+			if entry is not None:
+				value, flag, pv = entry
+				if flag == self.EXACT or (flag == self.LOWER and value >= beta) or (flag == self.UPPER and value <= alpha):
+					return (value, pv)
+
+		player_index = game.players.index(game.current_player)
+		maximizing = player_index == 0
+		generator, moves = self._ordered_moves(game, player_index, ply, last_key)
+		if self.futility_margin is not None and ply:
+			static = _cached_value(game.players[0], game)
+			if (static + self.futility_margin <= alpha) if maximizing else (static - self.futility_margin >= beta):
+				moves = [move for move in moves if move[1].type == "END_TURN"]
+
+		alpha_orig, beta_orig = alpha, beta
+		best_value = float("-inf") if maximizing else float("+inf")
+		best_pv = []
+		for score, move, commuting_key in moves:
+			self.nodes += 1
+			if self.budget is not None:
+				self.budget.tick()
+			mark = game.mark()
+			try:
+				turn_ended = generator.apply(move)
+				_resolve_choice(game.players[player_index])
+				if turn_ended:
+					value, pv = self._search(game, turns - 1, ply + 1, alpha, beta)
+				else:
+					value, pv = self._search(game, turns, ply + 1, alpha, beta, commuting_key)
+			finally:
+				game.rollback(mark)
+			if (value > best_value) if maximizing else (value < best_value):
+				best_value = value
+				best_pv = [(player_index, move)] + pv
+			if maximizing:
+				alpha = max(alpha, value)
+			else:
+				beta = min(beta, value)
+			if alpha >= beta:
+				self.cutoffs += 1
+				killers = self.killers[ply]
+				if move not in killers:
+					killers.insert(0, move)
+					del killers[2:]
+				self.history[move] += turns * turns
+				break
+
+		if key is not None:
+			if best_value <= alpha_orig:
+				flag = self.UPPER
+			elif best_value >= beta_orig:
+				flag = self.LOWER
+			else:
+				flag = self.EXACT
+			self.table.store(key, turns, (best_value, flag, best_pv))
+		return (best_value, best_pv)
+
+
+def alphabetaGetBestAction(player_index, game, depth, table=None, budget=None):
+	"""
+	Alpha-beta counterpart of minimaxGetBestAction (see AlphaBetaSearch).
+	Returns a (predicted_V, action_list) tuple; the game state is left unchanged.
+	"""
+	return AlphaBetaSearch(table, budget).search(player_index, game, depth)
+
+
+def minimaxIterativeDeepening(player_index, game, budget, max_depth=None, persistent=False, table=None, pool=None, alphabeta=False,
+	lazy=False, max_chains=None):
+	"""
+	Runs minimaxGetBestAction (or an AlphaBetaSearch if alphabeta is True) at
+	depth 1, 2, ... until the SearchBudget runs out (or max_depth is reached)
+	and returns a (predicted_V, action_list, depth) tuple for the deepest
+	completed search. A greedy action chain is kept as best so far with
+	depth 0, in case not even depth 1 completes.
+	lazy and max_chains are passed on to minimaxGetBestAction.
+	"""
+	if budget.deadline is None and budget.max_nodes is None and max_depth is None:
+		raise ValueError("Iterative deepening needs a deadline, a node budget or a max depth")
+	best = _greedy_action_chain(game, player_index) + (0, )
+	if alphabeta:
+		searcher = AlphaBetaSearch(table, budget)
+	depth = 1
+	while max_depth is None or depth <= max_depth:
+		try:
+			if alphabeta:
+				value, actions = searcher.search(player_index, game, depth)
+			else:
+				value, actions = minimaxGetBestAction(player_index, game, depth, "", persistent, table, pool, budget, lazy, max_chains)
+		except SearchAborted as e:
+			print("Search at depth " + str(depth) + " aborted: " + str(e))
+			break
+		if actions is None:
+			# The game is over
+			break
+		best = (value, actions, depth)
+		depth += 1
+	return best
+
+
+class _NoLethal(Exception):
+	pass
+
+
+class LethalSolver:
+	"""
+	Exact search for a lethal line this turn, made with the real engine:
+	every sequence of moves (of a plain MoveGenerator, so that none is left
+	out) is tried depth first with journal marks, cutting the states from
+	which lethal.damage_bound(), an upper bound, cannot get through the
+	enemy health and armor, and remembering (by state hash) those already
+	known not to lead to lethal.
+	A line is only lethal if every outcome of its random effects wins (see
+	chance.py); after a random effect, the line follows its first outcome,
+	so it should be solved again once the effect happened (see _play_lethal()).
+	Lines going through a choice (eg. Discover) are not considered.
+	Chance events with more than \a samples outcomes (eg. random cards)
+	only branch on that many, drawn at random.
+	Each solve() is limited to max_nodes moves and/or time_budget seconds.
+	"""
+	def __init__(self, max_nodes=10000, time_budget=None, samples=4):
+		self.max_nodes = max_nodes
+		self.time_budget = time_budget
+		self.samples = samples
+		self.memo = set()
+		self.nodes = 0
+		self.pruned = 0
+		self.hits = 0
+
+	def solve(self, player):
+		"""
+		Returns the moves of a lethal line for \a player, or None if there
+		is none or the budget runs out before one is found.
+		"""
+		from . import zobrist
+		deadline = time.time() + self.time_budget if self.time_budget is not None else None
+		self.budget = SearchBudget(deadline, self.max_nodes)
+		self.memo.clear()
+		zobrist.start()
+		try:
+			return self._solve(player)
+		except SearchAborted:
+			return None
+		finally:
+			zobrist.stop()
+
+	def _solve(self, player):
+		from .lethal import damage_bound
+		hero = player.opponent.hero
+		if damage_bound(player) < hero.health + hero.armor:
+			self.pruned += 1
+			return None
+		key = player.game.state_hash()
+		if key in self.memo:
+			self.hits += 1
+			return None
+		generator = MoveGenerator(player)
+		for move in generator:
+			if move.type == "END_TURN":
+				continue
+			self.budget.tick()
+			self.nodes += 1
+			line = self._solve_move(generator, move)
+			if line is not None:
+				return [move] + line
+		self.memo.add(key)
+		return None
+
+	def _solve_move(self, generator, move):
+		"""
+		Returns the rest of a lethal line starting with \a move, if there is
+		one after every outcome of the move.
+		"""
+		player = generator.player
+		game = player.game
+
+		def rest():
+			generator.apply(move)
+			if player.playstate == PlayState.WON:
+				return []
+			if game.ended or player.choice or game.current_player is not player:
+				raise _NoLethal()
+			line = self._solve(player)
+			if line is None:
+				raise _NoLethal()
+			return line
+
+		try:
+			return chance.outcomes(game, rest, self.samples)[0][1]
+		except _NoLethal:
+			return None
+
+
+def _play_lethal(player, solver):
+	"""
+	Plays the lethal line \a solver finds for \a player, solving again
+	after every move in case of random effects.
+	Returns True if it won the game, False if there was no lethal to play.
+	"""
+	game = player.game
+	while not game.ended:
+		line = solver.solve(player)
+		if line is None:
+			return False
+		print("Lethal line found: " + str(line))
+		apply_move(player, line[0])
+		_resolve_choice(player)
+	return player.playstate == PlayState.WON
+
+
+def minimaxPlayer(player, game, persistent=False, table=None, pool=None, time_budget=None, max_nodes=None, max_depth=None, alphabeta=False,
+	lazy=False, max_chains=None, lethal=None):
 	"""
 	Wrapper that makes use of minimaxGetBestAction to play the game.
+	With a time_budget (in seconds) or max_nodes, the search is iteratively
+	deepened (up to max_depth, if given) instead of running at depth 2.
+	If alphabeta is True, an AlphaBetaSearch replaces the beam search.
+	lazy and max_chains are passed on to minimaxGetBestAction.
+	If a LethalSolver is given, a lethal line is looked for first.
 	"""
 	if game.ended:
 		return game
+	if lethal is not None and (_play_lethal(player, lethal) or game.ended):
+		return game
 	available_actions = get_all_available_actions(player)
 	if not available_actions:
 		return game
 
-	stuff = minimaxGetBestAction(0, game, 2, "")
+	if table is not None:
+		table.new_search()
+	if time_budget is None and max_nodes is None:
+		if alphabeta:
+			stuff = alphabetaGetBestAction(0, game, max_depth or 2, table)
+		else:
+			stuff = minimaxGetBestAction(0, game, max_depth or 2, "", persistent, table, pool, lazy=lazy, max_chains=max_chains)
+	else:
+		deadline = time.time() + time_budget if time_budget is not None else None
+		budget = SearchBudget(deadline, max_nodes)
+		stuff = minimaxIterativeDeepening(0, game, budget, max_depth, persistent, table, pool, alphabeta, lazy, max_chains)
+		print("Iterative deepening reached depth " + str(stuff[2]) + " after " + str(budget.nodes) + " nodes")
 	print("Minimax says our best actions to take right now have value " + str(stuff[0]))
 	print("The action sequence is " + str(stuff[1]))
 	print("Returned stuff is " + str(stuff))
 	print("============================================================================")
 
-	for action in stuff[1]:
-		perform_action(game, 0, action[0], action[1])
+	for move in stuff[1]:
+		try:
+			apply_move(game.players[0], move)
+		except InvalidAction:
+			# A random outcome differs from the one searched
+			print("Move " + str(move) + " cannot be made anymore, ending the turn")
+			game.end_turn()
+			break
+	return game
+
+
+def _resolve_choice(player):
+	# Moves do not cover choices (eg. Discover), pick one at random
+	if player.choice:
+		player.choice.choose(random.choice(player.choice.cards))
+
+
+def _face_first_move(generator):
+	"""
+	Returns the move of a MoveGenerator faceFirstLegalMovePlayer would
+	make, without its logging.
+	"""
+	first = generator.moves[0]
+	moves = [move for move in generator if move.source == first.source and move.type == first.type]
+	if first.choose is not None:
+		choose = random.choice(moves).choose
+		moves = [move for move in moves if move.choose == choose]
+	opponent_hero = generator.player.opponent.hero.entity_id
+	for move in moves:
+		if move.target == opponent_hero:
+			return move
+	return moves[0]
+
+
+class _MCTSNode:
+	def __init__(self, player_index):
+		# The player who made the move leading to this node
+		self.player_index = player_index
+		self.children = {}
+		self.visits = 0
+		self.value = 0.
+		# For moves ending a turn while pondering, the state_hash() of the
+		# first state the move led to (see Ponderer)
+		self.state_hash = None
+
+	def ucb(self, parent_visits, exploration):
+		return self.value / self.visits + exploration * math.sqrt(math.log(parent_visits) / self.visits)
+
+
+def _mcts_rollout(game, player_index, rollout_turns, evaluate_leaves, value_scale):
+	"""
+	Plays face first from the current state and returns the reward (between
+	0 and 1) of the given player.
+	"""
+	turn = game.turn
+	while not game.ended:
+		if rollout_turns is not None and game.turn - turn >= rollout_turns:
+			break
+		generator = _move_generator(game.current_player)
+		generator.apply(_face_first_move(generator))
+		_resolve_choice(generator.player)
+	player = game.players[player_index]
+	if player.playstate == PlayState.WON:
+		return 1.
+	elif player.playstate == PlayState.LOST:
+		return 0.
+	elif game.ended or not evaluate_leaves:
+		return 0.5
+	return 1. / (1. + math.exp(-approximateV(player, game) / value_scale))
+
+
+def _mcts_iteration(root, game, player_index, exploration, rollout_turns, evaluate_leaves, value_scale, hash_turns=False):
+	"""
+	Runs one selection, expansion, rollout and backpropagation from root,
+	the node of the current game state, which is left unchanged.
+	If hash_turns is True, nodes of moves ending a turn record their state_hash.
+	"""
+	node = root
+	path = [root]
+	mark = game.mark()
+	try:
+		# Selection, until a move was never tried from the node
+		while not game.ended:
+			current_index = game.players.index(game.current_player)
+			generator = _move_generator(game.current_player)
+			moves = generator.moves
+			untried = [move for move in moves if move not in node.children]
+			if untried:
+				move = random.choice(untried)
+			else:
+				move = max(moves, key=lambda m: node.children[m].ucb(node.visits, exploration))
+			turn_ended = generator.apply(move)
+			_resolve_choice(generator.player)
+			if untried:
+				# Only added once the move was made: a move raising would
+				# otherwise leave a child which is never visited
+				node.children[move] = _MCTSNode(current_index)
+			node = node.children[move]
+			path.append(node)
+			if turn_ended and hash_turns and node.state_hash is None:
+				node.state_hash = _ponder_hash(game)
+			if untried:
+				break
+		reward = _mcts_rollout(game, player_index, rollout_turns, evaluate_leaves, value_scale)
+	finally:
+		game.rollback(mark)
+
+	# Backpropagation
+	root.visits += 1
+	for node in path[1:]:
+		node.visits += 1
+		node.value += reward if node.player_index == player_index else 1. - reward
+
+
+def mctsGetBestAction(player_index, game, iterations=None, time_budget=None, exploration=math.sqrt(2),
+	rollout_turns=None, evaluate_leaves=False, value_scale=10., root=None, determinizer=None):
+	"""
+	Runs a Monte Carlo Tree Search with UCT selection from the current game
+	state and returns an (estimated_win_rate, move) tuple (see moves.Move).
+	The search stops after the given number of iterations or time_budget seconds,
+	whichever comes first (100 iterations if neither is given). Rollouts play
+	face first, for at most rollout_turns turns if given; if evaluate_leaves is
+	True, rollouts which did not end the game are scored by approximateV,
+	squashed by a logistic function of the given scale.
+	The tree is open loop: random outcomes are sampled again at every iteration.
+	A root node from an earlier search (eg. the child of the move made since,
+	or the node a Ponderer matched) can be given to carry its statistics over;
+	it is updated in place. With a Determinizer (see determinization.py),
+	every iteration runs on a new sample of the hidden cards, so that the
+	search does not see the opponent's hand or the order of the decks.
+	The game state is left unchanged.
+	"""
+	if iterations is None and time_budget is None:
+		iterations = 100
+	deadline = time.time() + time_budget if time_budget is not None else None
+	if root is None:
+		root = _MCTSNode(None)
+	root_moves = _move_generator(game.players[player_index]).moves
+	if len(root_moves) == 1:
+		return (0.5, root_moves[0])
+
+	iteration = 0
+	while iterations is None or iteration < iterations:
+		if deadline is not None and iteration and time.time() >= deadline:
+			break
+		iteration += 1
+		if determinizer is not None:
+			mark = determinizer.sample()
+		try:
+			_mcts_iteration(root, game, player_index, exploration, rollout_turns, evaluate_leaves, value_scale)
+		finally:
+			if determinizer is not None:
+				game.rollback(mark)
+
+	print("MCTS ran " + str(iteration) + " iterations for player_index " + str(player_index))
+	# A reused root can have children for moves which are not legal anymore
+	move = max((m for m in root_moves if m in root.children), key=lambda m: root.children[m].visits)
+	best = root.children[move]
+	return (best.value / best.visits, move)
+
+
+class Ponderer:
+	"""
+	Searches during the opponent's turn ("pondering"). start() forks a
+	process running MCTS iterations (see mctsGetBestAction for the options)
+	for player_index from the state the opponent is to move in, until
+	stop() is called or max_iterations is reached.
+	Once the opponent's turn is over, stop() returns the node of the tree
+	matching the current state, found by the state_hash() of the moves
+	ending a turn, so that mctsGetBestAction carries on from its statistics.
+	NOTE: This requires a platform with the "fork" start method.
+	"""
+	def __init__(self, max_iterations=None, exploration=math.sqrt(2), rollout_turns=None,
+		evaluate_leaves=False, value_scale=10.):
+		self.max_iterations = max_iterations
+		self.options = (exploration, rollout_turns, evaluate_leaves, value_scale)
+		self.iterations = 0
+		self._process = None
+		self._connection = None
+
+	@property
+	def pondering(self):
+		return self._process is not None
+
+	def start(self, game, player_index):
+		import multiprocessing
+		if self.pondering:
+			raise RuntimeError("Already pondering")
+		context = multiprocessing.get_context("fork")
+		self._connection, child = context.Pipe()
+		args = (child, game, player_index, self.max_iterations, self.options)
+		self._process = context.Process(target=_ponder, args=args, daemon=True)
+		self._process.start()
+
+	def stop(self, game):
+		"""
+		Stops pondering and returns the node matching the state of \a game
+		(the one visited the most if several do), or None.
+		"""
+		if not self.pondering:
+			return None
+		try:
+			self._connection.send(None)
+			self.iterations, root = self._connection.recv()
+		finally:
+			self._process.join()
+			self._connection.close()
+			self._process = self._connection = None
+		state_hash = _ponder_hash(game)
+		ret = None
+		stack = [root]
+		while stack:
+			node = stack.pop()
+			if node.state_hash == state_hash and (ret is None or node.visits > ret.visits):
+				ret = node
+			stack.extend(node.children.values())
+		return ret
+
+
+def _ponder_hash(game):
+	"""
+	Returns the state_hash() of \a game without total_mana_spent, which is
+	kept by the agents making the moves rather than by the rules.
+	"""
+	from . import zobrist
+	ret = game.state_hash()
+	for player in game.players:
+		if "total_mana_spent" in player.__dict__:
+			ret ^= zobrist._key(player.entity_id, "total_mana_spent", player.total_mana_spent)
+	return ret
+
+
+def _ponder(connection, game, player_index, max_iterations, options):
+	root = _MCTSNode(None)
+	iterations = 0
+	while not connection.poll() and (max_iterations is None or iterations < max_iterations):
+		_mcts_iteration(root, game, player_index, *options, hash_turns=True)
+		iterations += 1
+	# Wait for stop()
+	connection.recv()
+	connection.send((iterations, root))
+	connection.close()
+
+
+def mctsPlayer(player, game, iterations=None, time_budget=1., ponderer=None, lethal=None, **kwargs):
+	"""
+	Plays a full turn, making every move with mctsGetBestAction under
+	the given per-move budget (see mctsGetBestAction for the other options).
+	The tree is kept from one move to the next. With a Ponderer, the search
+	goes on during the opponent's turn and is picked up on the next turn.
+	If a LethalSolver is given, a lethal line is looked for first.
+	"""
+	player_index = game.players.index(player)
+	if lethal is not None and (_play_lethal(player, lethal) or game.ended):
+		if ponderer is not None:
+			ponderer.stop(game)
+		return game
+	root = ponderer.stop(game) if ponderer is not None else None
+	if root is not None:
+		print("Pondering matched a node with " + str(root.visits) + " visits")
+	while not game.ended:
+		if root is None:
+			root = _MCTSNode(None)
+		value, move = mctsGetBestAction(player_index, game, iterations, time_budget, root=root, **kwargs)
+		print("MCTS says our best move is " + str(move) + " with estimated win rate " + str(value))
+		root = root.children.get(move)
+		if apply_move(player, move):
+			break
+		_resolve_choice(player)
+	if ponderer is not None and not game.ended:
+		ponderer.start(game, player_index)
 	return game
 
 
-def TDLearningPlayer(player, game):
+def TDLearningPlayer(player, game, pool=None, learner=None):
 	"""
 	Implements a TD-learning player with an epsilon-greedy algorithm
 	and Monte Carlo bootstrapping to learn how to play a specific deck
 	against a given opponent.
+	Greedy moves are picked by lookahead(), on the given LookaheadPool if any.
+	Updates are made by \a learner (td_learner by default, see TDLearner),
+	or by incorporateFeedback() without NumPy.
 	"""
+	if learner is None:
+		learner = td_learner
+	if learner is not None and learner.episode is not game:
+		learner.reset()
+		learner.episode = game
 	actions_taken = 0
 	while True:
 		if game.ended:
 			break
-		phi = featureExtractor2(player, game)
-		vpi = approximateV(player, game)
+		if learner is not None:
+			row = featureRow(player, game)
+		else:
+			phi = featureExtractor2(player, game)
+			vpi = approximateV(player, game)
 
-		# make a simple list of all the available actions at a given point
-		available_actions = get_all_available_actions(player)
+		# make a simple list of all the available moves at a given point
+		generator = _move_generator(player)
 		#print("====== CURRENT PLAYER MANA:", player.mana)
 
-		if not available_actions:
-			break
+		if random.random() < epsilon:
+			# Pick an action, then one of its moves (targets)
+			actions = []
+			for move in generator:
+				if move[:2] not in actions:
+					actions.append(move[:2])
+			action = random.choice(actions)
+			best_move = random.choice([move for move in generator if move[:2] == action])
 		else:
-			if random.random() < epsilon:
-				action_type, entity = random.choice(available_actions)
-				if action_type == "CARD":
-					target = None
-					card = entity
-					if card.must_choose_one:
-						card = random.choice(card.choose_cards)
-					if card.requires_target():
-						target = random.choice(card.targets)
-					card.play(target=target)
-					player.total_mana_spent += card.cost
-
-				elif action_type == "HEROPOWER":
-					heropower = player.hero.power
-					if heropower.requires_target():
-						heropower.use(target=random.choice(heropower.targets))
-					else:
-						heropower.use()
-					player.total_mana_spent += 2
-				elif action_type == "ATTACK":
-					entity.attack(random.choice(entity.targets))
-				else: # end turn
-					break
-				actions_taken += 1
-			else:
-				# Go through every action and see which one is the best one
-				best_action_index = -1
-				best_action_target = -1
-				best_value = float("-inf")
-				for _ in range(1):
-					for i in range(len(available_actions)):
-						num_targets = get_num_targets(game, i)
-						if num_targets == -1:
-							vpi = get_value_of_move(game, i)
-							action_type, action_entity = get_action_by_index(game, i)
-							if vpi > best_value:
-								best_value = vpi
-								best_action_index = i
-								best_action_target = -1
-						else:
-							for t in range(num_targets):
-								vpi = get_value_of_move(game, i, moveTarget=t)
-								action_type, action_entity = get_action_by_index(game, i)
-								if vpi > best_value:
-									best_value = vpi
-									best_action_index = i
-									best_action_target = t
-
-				# NOW perform the action
-				best_action_type, best_entity = available_actions[best_action_index]
-				#print("============ BEST ACTION IS", best_action_type, "with", best_entity, "and target", stringify_target_info(player, best_action_type, best_entity, best_action_target), "(value " + str(best_value) + " )")
-				if best_action_type == "CARD":
-					target = None
-					card = best_entity
-					if card.must_choose_one:
-						card = card.choose_cards[best_action_target]
-					if card.requires_target():
-						target = card.targets[best_action_target]
-					card.play(target=target)
-					player.total_mana_spent += card.cost
-				elif best_action_type == "HEROPOWER":
-					heropower = player.hero.power
-					if heropower.requires_target():
-						heropower.use(target=heropower.targets[best_action_target])
-					else:
-						heropower.use()
-					player.total_mana_spent += 2
-				elif best_action_type == "ATTACK":
-					best_entity.attack(best_entity.targets[best_action_target])
-				else:
-					break # END TURN
-				actions_taken += 1
+			# Look one move ahead and take the best one (the first on ties)
+			values = lookahead(generator, pool=pool)
+			best_value = max(values)
+			best_move = generator.moves[values.index(best_value)]
+
+		# NOW perform the move
+		#print("============ BEST MOVE IS", best_move, "(value " + str(best_value) + " )")
+		if best_move.type == "END_TURN":
+			break
+		source, choose, target = generator.entities[best_move]
+		if best_move.type == "CARD":
+			player.total_mana_spent += (choose or source).cost
+		elif best_move.type == "HEROPOWER":
+			player.total_mana_spent += 2
+		generator.apply(best_move)
+		actions_taken += 1
 
 		# uncomment this if you want to see how the weight vector changes
 		#if sum(_weights[feature] for feature in phi) > 0:
 		#	input()
 
+		if learner is not None:
+			if epsilon != 0 and not game.ended:
+				learner.step(row, 0, featureRow(player, game))
+			continue
 		# reward = 0, discount = 0.9
 		vprimepi = approximateV(player, game)
 		#print("vpi is", vpi, " vprimepi is ", vprimepi)
@@ -699,11 +2567,14 @@ def TDLearningPlayer(player, game):
 			incorporateFeedback(phi, vpi, vprimepi, 0)
 		vpi = vprimepi
 
-	if game.ended and epsilon != 0:
-		if player == game.loser:
-			incorporateFeedback(phi, vpi, 0, -100)
-		else: # Ties are impossible with our deck
-			incorporateFeedback(phi, vpi, 0, 100)
+	if game.ended and epsilon != 0 and actions_taken:
+		# Ties are impossible with our deck
+		reward = -100 if player == game.loser else 100
+		if learner is not None:
+			# The last move ended the game
+			learner.step(row, reward)
+		else:
+			incorporateFeedback(phi, vpi, 0, reward)
 	#print("=========================== TURN OVER")
 
 	game.end_turn()
@@ -786,6 +2657,7 @@ def play_turn(game: ".game.Game") -> ".game.Game":
 		#return faceFirstLegalMovePlayer(player, game)
 		return TDLearningPlayer(player, game)
 		#return minimaxPlayer(player, game)
+		#return mctsPlayer(player, game)
 	else:
 		return faceFirstLegalMovePlayer(player, game)
 
@@ -863,10 +2735,12 @@ def play_full_game(weights) -> ".game.Game":
 			mull_count = random.randint(0, len(player.choice.cards))
 			cards_to_mulligan = random.sample(player.choice.cards, mull_count)
 			player.choice.choose(*cards_to_mulligan)
+		# Only the card ids are used afterwards, so there is no need
+		# to copy the whole game along with the hand
 		if player == game.players[0]:
-			game.startCards = copy.deepcopy(player.hand)
+			game.startCards = player.hand[:]
 		else:
-			game.oppCards = copy.deepcopy(player.hand)
+			game.oppCards = player.hand[:]
 
 	while True:
 		play_turn(game)
@@ -0,0 +1,277 @@
+"""
+Incremental Zobrist hashing of game states, and a transposition table
+
+The hash of a game is the XOR of a pseudo-random 64-bit key for every
+(entity_id, attribute, value) triple of its entities. While tracking is
+on, every attribute write updates the hash of the game it belongs to, so
+that zone moves, damage, buffs, mana and tag changes cost a couple of XORs
+instead of a full rehash. The hash itself is stored on the game, which
+means it is journaled, rolled back and cloned along with the state.
+Zones are hashed through the zone and controller of each entity, which
+says nothing of the order of the cards within a zone. The positions of
+the minions in play matter (eg. Defender of Argus, Explosive Shot), so a
+key for each (entity_id, position) on the fields is folded into the hash
+when it is read; the fields hold at most 14 minions.
+"""
+from hashlib import blake2b
+from . import journal
+from .entity import BaseEntity
+
+
+# Attributes which do not describe the position, or which differ between
+# action orders reaching the same position (bookkeeping counters)
+IGNORED_ATTRIBUTES = {
+	"_zobrist", "_zobrist_generation", "play_counter", "tick", "turn_start", "uuid",
+	# See accumulator.py
+	"_accumulated", "_accumulator_dirty", "_accumulator_generation",
+	"_accumulator_totals", "_accumulator_volatile",
+}
+
+HASHED_TYPES = (type(None), int, float, str)
+
+# Key for each (entity_id, attribute, value) triple, filled lazily.
+# Keys are derived from the triple itself rather than drawn at random, so
+# that they are the same in every process (see utils.FrontierPool).
+_keys = {}
+
+# Number of start() calls not yet matched by stop()
+_depth = 0
+# Bumped by stop(): hashes stored by an earlier generation are stale
+_generation = 0
+
+
+def _key(entity_id, name, value):
+	cls = value.__class__
+	if cls is not int and cls is not str and value is not None:
+		if isinstance(value, BaseEntity):
+			value = ("entity", value.__dict__.get("entity_id"))
+		elif isinstance(value, int):
+			# Enums and booleans hash as their integer value
+			value = int(value)
+		elif not isinstance(value, HASHED_TYPES):
+			# Containers, actions, scripts, ...
+			return 0
+	k = (entity_id, name, value)
+	ret = _keys.get(k)
+	if ret is None:
+		digest = blake2b(repr(k).encode(), digest_size=8).digest()
+		ret = _keys[k] = int.from_bytes(digest, "little")
+	return ret
+
+
+def _entity_hash(entity):
+	d = entity.__dict__
+	entity_id = d.get("entity_id")
+	ret = 0
+	for name, value in d.items():
+		if name not in IGNORED_ATTRIBUTES:
+			ret ^= _key(entity_id, name, value)
+	return ret
+
+
+def _entities(game):
+	"""
+	Yield every entity reachable from \a game.
+	"""
+	seen = {id(game)}
+	stack = [game]
+	while stack:
+		entity = stack.pop()
+		yield entity
+		for value in entity.__dict__.values():
+			if isinstance(value, (list, tuple)):
+				values = value
+			elif isinstance(value, BaseEntity):
+				values = (value, )
+			else:
+				continue
+			for v in values:
+				if isinstance(v, BaseEntity) and id(v) not in seen:
+					seen.add(id(v))
+					if "entity_id" in v.__dict__ and getattr(v, "game", None) is game:
+						stack.append(v)
+
+
+def _attributes_hash(game):
+	ret = 0
+	for entity in _entities(game):
+		ret ^= _entity_hash(entity)
+	return ret
+
+
+def _positions_hash(game):
+	ret = 0
+	for player in game.players:
+		for position, minion in enumerate(player.field, 1):
+			ret ^= _key(minion.entity_id, "field_position", position)
+	return ret
+
+
+def compute(game):
+	"""
+	Return the hash of \a game, computed from scratch.
+	NOTE: Entities which are not in any zone list anymore (eg. played spells)
+	are not found here, but keep counting towards the incremental hash.
+	"""
+	return _attributes_hash(game) ^ _positions_hash(game)
+
+
+def _update(game, value):
+	if journal.active is not None:
+		journal.active.record_attr(game, "_zobrist")
+	game.__dict__["_zobrist"] ^= value
+
+
+def _observe(obj, name, old):
+	if name in IGNORED_ATTRIBUTES:
+		return
+	d = obj.__dict__
+	new = d.get(name, journal.MISSING)
+	if new is old:
+		return
+	entity_id = d.get("entity_id")
+	if entity_id is None:
+		return
+	game = getattr(obj, "game", None)
+	if game is None or game.__dict__.get("_zobrist_generation") != _generation:
+		return
+	if name == "entity_id":
+		# A new entity joins the game
+		_update(game, _entity_hash(obj))
+	else:
+		if old is not journal.MISSING:
+			value = _key(entity_id, name, old)
+		else:
+			value = 0
+		if new is not journal.MISSING:
+			value ^= _key(entity_id, name, new)
+		if value:
+			_update(game, value)
+
+
+def side_key(player_index):
+	"""
+	Return a key to XOR into a state hash for the side to move.
+	"""
+	return _key(0, "side", player_index)
+
+
+def start():
+	"""
+	Start tracking attribute writes (if not already), so that the hashes
+	returned by state_hash() are kept up to date. Every start() must be
+	matched by a stop().
+	"""
+	global _depth
+	if not _depth:
+		journal.add_observer(_observe)
+	_depth += 1
+
+
+def tracking():
+	"""
+	Returns whether attribute writes are being tracked (see start()).
+	"""
+	return _depth > 0
+
+
+def stop():
+	"""
+	Release a start(). Once tracking stops, stored hashes become stale and
+	are recomputed by the next state_hash().
+	"""
+	global _depth, _generation
+	_depth -= 1
+	if not _depth:
+		journal.remove_observer(_observe)
+		_generation += 1
+
+
+def state_hash(game):
+	"""
+	Return the 64-bit hash of \a game. The hash of the attributes is
+	computed from scratch the first time and then maintained incrementally
+	until stop(); the positions on the fields are hashed on every call.
+	"""
+	d = game.__dict__
+	if not _depth:
+		return compute(game)
+	if d.get("_zobrist_generation") != _generation:
+		game._zobrist = _attributes_hash(game)
+		game._zobrist_generation = _generation
+	return d["_zobrist"] ^ _positions_hash(game)
+
+
+class TranspositionTable:
+	"""
+	A fixed-size table of search results keyed by state hash.
+	\a size is rounded up to a power of two. Each slot holds one entry;
+	when two states map to the same slot, the entry searched to the
+	greater depth is kept, unless it was stored during an older search
+	(see new_search()), in which case it is always replaced.
+	"""
+	def __init__(self, size=1 << 16):
+		self.size = 1
+		while self.size < size:
+			self.size <<= 1
+		self.mask = self.size - 1
+		self.generation = 0
+		self.clear()
+
+	def __len__(self):
+		return self.size - self.slots.count(None)
+
+	def __repr__(self):
+		return "<%s (%i/%i entries, %i hits, %i misses)>" % (
+			self.__class__.__name__, len(self), self.size, self.hits, self.misses
+		)
+
+	def clear(self):
+		self.slots = [None] * self.size
+		self.hits = 0
+		self.misses = 0
+		self.stores = 0
+		self.replacements = 0
+		self.rejections = 0
+
+	def new_search(self):
+		"""
+		Age every stored entry, so that it gets replaced before newer ones.
+		"""
+		self.generation += 1
+
+	def lookup(self, key, depth):
+		"""
+		Return the value stored for \a key at \a depth, or None.
+		"""
+		entry = self.slots[key & self.mask]
+		if entry is not None and entry[0] == key and entry[1] == depth:
+			self.hits += 1
+			return entry[2]
+		self.misses += 1
+		return None
+
+	def store(self, key, depth, value):
+		"""
+		Store \a value for \a key at \a depth, following the replacement policy.
+		"""
+		index = key & self.mask
+		entry = self.slots[index]
+		if entry is not None and entry[0] != key:
+			if entry[1] > depth and entry[3] == self.generation:
+				self.rejections += 1
+				return
+			self.replacements += 1
+		self.slots[index] = (key, depth, value, self.generation)
+		self.stores += 1
+
+	@property
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"stores": self.stores,
+			"replacements": self.replacements,
+			"rejections": self.rejections,
+			"entries": len(self),
+		}
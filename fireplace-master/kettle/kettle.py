@@ -12,6 +12,7 @@ from hearthstone.enums import (
 from fireplace import actions, cards
 from fireplace.exceptions import GameOver
 from fireplace.game import BaseGame as Game
+from fireplace.moves import MoveGenerator
 from fireplace.player import Player
 from fireplace.utils import CardList
 
@@ -101,39 +102,17 @@ class KettleManager:
 		for tag in entity.tags:
 			self.refresh_tag(entity, tag)
 
-	def get_options(self, entity):
+	def get_options(self, player):
+		# Same moves as the agents, one option per card or character
 		ret = []
-		if entity.zone == Zone.HAND:
-			if entity.type in (CardType.SPELL, CardType.MINION, CardType.WEAPON):
-				if entity.is_playable():
-					ret.append({
-						"Type": OptionType.POWER,
-						"MainOption": {
-							"ID": entity,
-							"Targets": entity.targets,
-						},
-					})
-
-		elif entity.zone == Zone.PLAY:
-			if entity.type == CardType.HERO_POWER:
-				if entity.is_usable():
-					ret.append({
-						"Type": OptionType.POWER,
-						"MainOption": {
-							"ID": entity,
-							"Targets": entity.targets,
-						}
-					})
-			elif entity.type in (CardType.HERO, CardType.MINION):
-				if entity.can_attack():
-					ret.append({
-						"Type": OptionType.POWER,
-						"MainOption": {
-							"ID": entity,
-							"Targets": entity.attack_targets,
-						}
-					})
-
+		for entity, targets in MoveGenerator(player).sources:
+			ret.append({
+				"Type": OptionType.POWER,
+				"MainOption": {
+					"ID": entity,
+					"Targets": targets,
+				},
+			})
 		return ret
 
 	def refresh_choices(self):
@@ -158,10 +137,7 @@ class KettleManager:
 		if self.game.current_player.choice:
 			return self.refresh_choices()
 		self.options = [{"Type": OptionType.END_TURN}]
-
-		for entity in self.game.current_player.actionable_entities:
-			for option in self.get_options(entity):
-				self.options.append(option)
+		self.options += self.get_options(self.game.current_player)
 
 		payload = {
 			"Type": "Options",
@@ -0,0 +1,67 @@
+import pytest
+from utils import *
+from fireplace import chance, utils as agents
+from fireplace.moves import MoveGenerator
+
+
+def test_chance_outcomes():
+	game = prepare_game()
+	game.player2.summon(WISP)
+	opponent = game.player2.hero
+	missiles = game.player1.give("EX1_277")
+	results = chance.outcomes(game, lambda: (missiles.play(), opponent.health)[1])
+	assert missiles.zone == Zone.HAND
+	assert len(game.player2.field) == 1
+	# The Wisp dies to the first missile hitting it
+	assert sorted(results) == [(0.125, 27), (0.125, 28), (0.25, 28), (0.5, 28)]
+	assert sum(p * health for p, health in results) == pytest.approx(30 - 2.125)
+
+	# Sparse sampling
+	random.seed(1)
+	results = chance.outcomes(game, lambda: (missiles.play(), opponent.health)[1], samples=1)
+	assert len(results) == 1
+	assert results[0][0] == 1
+
+
+def test_chance_events():
+	game = prepare_empty_game()
+	for card in (WISP, WISP, MOONFIRE):
+		game.player1.give(card).zone = Zone.DECK
+	events = []
+
+	def handler(event):
+		events.append(event)
+		return len(event.outcomes) - 1
+
+	chance.set_handler(handler)
+	try:
+		card = game.player1.draw()
+	finally:
+		chance.set_handler(None)
+	assert len(events) == 1
+	assert events[0].kind == "DRAW"
+	assert [c.id for c in events[0].outcomes] == [WISP, MOONFIRE]
+	assert events[0].probabilities == pytest.approx((2 / 3, 1 / 3))
+	assert card.id == MOONFIRE
+	assert len(game.player1.deck) == 2
+
+
+def test_lookahead_expectimax():
+	game = prepare_game()
+	game.player2.summon(WISP)
+	player = game.player1
+	player.total_mana_spent = player.opponent.total_mana_spent = 0
+	missiles = player.give("EX1_277")
+	generator = MoveGenerator(player)
+	values = agents.lookahead(generator, expectimax=True)
+	assert len(game.player2.field) == 1
+	assert values[-1] == pytest.approx(agents.approximateV(player, game))
+
+	def value():
+		missiles.play()
+		player.total_mana_spent += missiles.cost
+		return agents.approximateV(player, game)
+
+	expected = sum(p * v for p, v in chance.outcomes(game, value))
+	move = [move for move in generator if move.source == missiles.entity_id][0]
+	assert values[generator.moves.index(move)] == pytest.approx(expected)
@@ -0,0 +1,98 @@
+from utils import *
+
+
+def test_clone():
+	game = prepare_game()
+	wisp = game.player1.give(WISP)
+	wisp.play()
+	game.end_turn()
+	game.end_turn()
+
+	clone = game.clone()
+	assert clone is not game
+	assert clone.turn == game.turn
+	assert clone.current_player is clone.player1
+	assert clone.player1.opponent is clone.player2
+	assert len(clone.player1.hand) == len(game.player1.hand)
+	assert len(clone.player1.deck) == len(game.player1.deck)
+	assert len(clone.player1.field) == 1
+
+	wisp2 = clone.player1.field[0]
+	assert wisp2 is not wisp
+	assert wisp2.controller is clone.player1
+	assert wisp2.game is clone
+	assert wisp2.entity_id == wisp.entity_id
+	# Card data is shared between games
+	assert wisp2.data is wisp.data
+
+	wisp2.attack(clone.player2.hero)
+	assert clone.player2.hero.health == 29
+	assert game.player2.hero.health == 30
+	assert wisp.can_attack()
+	assert not wisp2.can_attack()
+
+	clone.end_turn()
+	assert clone.current_player is clone.player2
+	assert game.current_player is game.player1
+
+
+def test_clone_counterparts():
+	game = prepare_game()
+	wisp = game.player1.give(WISP)
+	memo = {}
+	wisp2 = wisp.clone(memo)
+	assert wisp2.id == WISP
+	assert wisp2.zone == Zone.HAND
+	assert memo[id(game)] is wisp2.game
+	assert memo[id(game.player1)] is wisp2.controller
+	assert wisp2 in wisp2.controller.hand
+	assert wisp not in wisp2.controller.hand
+
+
+def test_clone_auras():
+	game = prepare_game()
+	wisp = game.player1.give(WISP)
+	wisp.play()
+	raidleader = game.player1.give("CS2_122")
+	raidleader.play()
+	assert wisp.atk == 2
+
+	clone = game.clone()
+	wisp2, raidleader2 = clone.player1.field
+	assert wisp2.atk == 2
+	assert wisp2.buffs[0].source is raidleader2
+	assert clone.active_aura_buffs[0] is wisp2.buffs[0]
+
+	raidleader2.destroy()
+	assert wisp2.atk == 1
+	assert not clone.active_aura_buffs
+	assert wisp.atk == 2
+	assert game.active_aura_buffs
+
+
+def test_clone_choice():
+	game = prepare_game()
+	tracking = game.player1.give("DS1_184")
+	tracking.play()
+	assert game.player1.choice
+
+	clone = game.clone()
+	assert clone.player1.choice is not game.player1.choice
+	assert clone.player1.choice.player is clone.player1
+	choice = clone.player1.choice.cards[0]
+	clone.player1.choice.choose(choice)
+	assert not clone.player1.choice
+	assert choice in clone.player1.hand
+	assert game.player1.choice
+
+
+def test_clone_mulligan():
+	game = init_game(game_class=Game)
+	game.start()
+	clone = game.clone()
+	clone.player1.choice.choose()
+	clone.player2.choice.choose()
+	assert clone.turn == 1
+	assert clone.player2.hand.contains(THE_COIN)
+	assert game.turn == 0
+	assert game.player1.choice
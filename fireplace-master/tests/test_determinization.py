@@ -0,0 +1,68 @@
+from utils import *
+from collections import Counter
+from fireplace import utils as agents
+from fireplace.determinization import Determinizer
+from fireplace.moves import MoveGenerator
+from fireplace.utils import game_state_to_xml
+
+
+def _hidden(player, determinizer):
+	hand = [card for card in player.hand if not determinizer.known(card)]
+	return Counter(card.id for card in hand + list(player.deck))
+
+
+def test_determinizer():
+	random.seed(3)
+	game = agents.setup_game()
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.choice.choose()
+	for i in range(6):
+		agents.faceFirstLegalMovePlayer(game.current_player, game)
+	player = game.players[0]
+	opponent = player.opponent
+	before = game_state_to_xml(game)
+	determinizer = Determinizer(player)
+	hidden = _hidden(opponent, determinizer)
+	hand_size, deck_size = len(opponent.hand), len(opponent.deck)
+	# The hidden cards are the deck list less the played ones
+	assert determinizer.hidden_ids() == hidden
+
+	hands = set()
+	for i in range(20):
+		mark = determinizer.sample()
+		assert len(opponent.hand) == hand_size
+		assert len(opponent.deck) == deck_size
+		assert _hidden(opponent, determinizer) == hidden
+		hands.add(tuple(sorted(card.id for card in opponent.hand)))
+		game.rollback(mark)
+	assert len(hands) > 1
+	assert game_state_to_xml(game) == before
+
+	# The actual cards fill in for a short deck list
+	determinizer = Determinizer(player, deck=[WISP] * 10)
+	mark = determinizer.sample()
+	assert _hidden(opponent, determinizer)[WISP] == 10
+	assert len(opponent.hand) == hand_size
+	assert len(opponent.deck) == deck_size
+	game.rollback(mark)
+	assert game_state_to_xml(game) == before
+
+	clone = Determinizer(player).sample_game()
+	assert len(clone.players[1].hand) == hand_size
+	assert game_state_to_xml(game) == before
+
+
+def test_mcts_determinized():
+	random.seed(3)
+	game = agents.setup_game()
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.choice.choose()
+	before = game_state_to_xml(game)
+	player = game.current_player
+	player_index = game.players.index(player)
+	determinizer = Determinizer(player)
+	value, move = agents.mctsGetBestAction(player_index, game, 10, rollout_turns=1, determinizer=determinizer)
+	assert move in MoveGenerator(player)
+	assert game_state_to_xml(game) == before
@@ -0,0 +1,246 @@
+import pytest
+from utils import *
+from fireplace import accumulator, zobrist, utils as agents
+from fireplace.moves import MoveGenerator
+
+
+numpy = pytest.importorskip("numpy")
+
+
+def _feature_game():
+	random.seed(5)
+	game = agents.setup_game()
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.choice.choose()
+	for i in range(6):
+		agents.faceFirstLegalMovePlayer(game.current_player, game)
+	return game
+
+
+def test_feature_row():
+	game = _feature_game()
+	for player in game.players:
+		phi = agents.featureExtractor2(player, game)
+		assert tuple(phi) == agents.FEATURES
+		row = agents.featureRow(player, game)
+		assert list(row) == [phi[x] for x in agents.FEATURES]
+	# The current weights keep their meaning
+	assert set(agents.premade_weights) == set(agents.FEATURES)
+	weights = agents.weightVector()
+	assert list(weights) == [agents.premade_weights[x] for x in agents.FEATURES]
+	assert list(agents.weightVector({"hp_advantage": 2.})) == [0.] * 6 + [2.]
+
+
+def test_batch_evaluation():
+	game = _feature_game()
+	states = [(player, game) for player in game.players] * 3
+	matrix = agents.featureMatrix(states)
+	assert len(matrix) == 6
+	values = agents.batchApproximateStates(states)
+	for (player, game), value in zip(states, values):
+		assert value == pytest.approx(agents.approximateV(player, game))
+	# Rows are written in place
+	assert agents.featureMatrix(states[:2], matrix) is matrix
+	assert agents.batchApproximateRows(matrix[:2]) == pytest.approx(values[:2])
+	assert agents.batchApproximateRows([]) == []
+
+
+def _check_totals(game):
+	for player in game.players:
+		assert accumulator.field_totals(player) == accumulator.compute(player)
+
+
+def test_accumulator():
+	game = _feature_game()
+	accumulator.start()
+	zobrist.start()
+	try:
+		_check_totals(game)
+		player = game.current_player
+		# Aura buffs come and go without a write to the buffed minions
+		player.summon(WISP)
+		leader = player.summon("CS2_122")
+		_check_totals(game)
+		atk, cost = accumulator.field_totals(player)
+		mark = game.mark()
+		leader.destroy()
+		player.give(MOONFIRE).play(target=player.opponent.hero)
+		_check_totals(game)
+		# Raid Leader and its aura over the three other minions
+		assert accumulator.field_totals(player) == (atk - 2 - 3, cost - 3)
+		game.rollback(mark)
+		_check_totals(game)
+		assert game.state_hash() == zobrist.compute(game)
+
+		clone = game.clone()
+		for i in range(10):
+			for state in (game, clone):
+				agents.faceFirstLegalMovePlayer(state.current_player, state)
+				_check_totals(state)
+				assert state.state_hash() == zobrist.compute(state)
+		values = [agents.approximateV(player, game) for player in game.players]
+	finally:
+		zobrist.stop()
+		accumulator.stop()
+	assert values == [agents.approximateV(player, game) for player in game.players]
+
+
+def test_value_cache(monkeypatch):
+	game = _feature_game()
+	player = game.current_player
+	cache = agents.ValueCache(size=2)
+	# Nothing is cached without zobrist tracking
+	assert cache.value(player, game) == agents.approximateV(player, game)
+	assert not cache.misses and not len(cache)
+	zobrist.start()
+	try:
+		value = cache.value(player, game)
+		assert cache.value(player, game) == value
+		assert (cache.hits, cache.misses) == (1, 1)
+		cache.value(player.opponent, game)
+		mark = game.mark()
+		player.summon(WISP)
+		cache.value(player, game)
+		assert len(cache) == 2
+		game.rollback(mark)
+		# The least recently used entry was evicted
+		cache.value(player, game)
+		assert cache.misses == 4
+		assert cache.hit_rate == 1 / 5
+
+		# Entries are dropped when the weights change
+		monkeypatch.setitem(agents._weights, "bias", agents._weights["bias"] + 1)
+		assert cache.value(player, game) == pytest.approx(value + 1)
+		assert len(cache) == 1
+	finally:
+		zobrist.stop()
+
+
+def test_value_cache_search(monkeypatch):
+	game = _feature_game()
+	player_index = game.players.index(game.current_player)
+	random.seed(1)
+	value, actions = agents.AlphaBetaSearch().search(player_index, game, 1)
+	cache = agents.ValueCache()
+	monkeypatch.setattr(agents, "value_cache", cache)
+	for i in range(2):
+		random.seed(1)
+		assert agents.AlphaBetaSearch().search(player_index, game, 1) == (value, actions)
+	# The second search only evaluates cached states
+	assert cache.hits >= cache.misses
+	assert not zobrist.tracking()
+
+
+def test_td_learner():
+	weights = dict(agents.premade_weights)
+	learner = agents.TDLearner(alpha=.01, gamma=.5, lambda_=.5, weights=weights)
+	assert learner.config == {"alpha": .01, "gamma": .5, "lambda_": .5}
+	w = numpy.array([weights[x] for x in agents.FEATURES])
+	x0, x1, x2 = (numpy.arange(7.) + i for i in range(3))
+	delta = learner.step(x0, 1., x1)
+	assert delta == pytest.approx(1 + .5 * x1 @ w - x0 @ w)
+	w = w + .01 * delta * x0
+	assert learner.weights == pytest.approx(w)
+	# Written back to the weights, and the traces decay
+	assert [weights[x] for x in agents.FEATURES] == pytest.approx(w)
+	delta = learner.step(x1, -1., None)
+	assert delta == pytest.approx(-1 - x1 @ w)
+	assert learner.weights == pytest.approx(w + .01 * delta * (.25 * x0 + x1))
+	assert not learner.traces.any()
+
+	# Offline TD(lambda) over an episode, with the weights held fixed
+	rows, rewards = numpy.array([x0, x1, x2]), numpy.array([0., 1., 2.])
+	w = learner.weights.copy()
+	values = rows @ w
+	deltas = rewards + .5 * numpy.append(values[1:], 0.) - values
+	expected = w.copy()
+	traces = numpy.zeros(7)
+	for row, delta in zip(rows, deltas):
+		traces = .25 * traces + row
+		expected += .01 * delta * traces
+	assert learner.episode_update(rows, rewards) == pytest.approx(deltas)
+	assert learner.weights == pytest.approx(expected)
+
+	# Minibatch TD(0)
+	w = learner.weights.copy()
+	deltas = numpy.array([1 + .5 * x1 @ w - x0 @ w, 2 - x1 @ w])
+	assert learner.batch_update([x0, x1], [1., 2.], [x1, x2], [False, True]) == pytest.approx(deltas)
+	assert learner.weights == pytest.approx(w + .01 * (deltas[0] * x0 + deltas[1] * x1) / 2)
+
+
+def test_td_learner_weights(monkeypatch):
+	monkeypatch.setattr(agents, "_weights", agents._Weights(float, agents.premade_weights))
+	learner = agents.TDLearner()
+	monkeypatch.setitem(agents._weights, "bias", 2.)
+	# Changes to the weights are picked up
+	row = numpy.zeros(7)
+	row[0] = 1
+	assert learner.value(row) == 2.
+	learner.step(row, 1.)
+	assert agents._weights["bias"] == pytest.approx(2 + .001 * (1 - 2))
+
+
+def test_td_learning_player(monkeypatch):
+	game = _feature_game()
+	monkeypatch.setattr(agents, "epsilon", .5)
+	learner = agents.TDLearner(weights=dict(agents.premade_weights), record=True)
+	for i in range(4):
+		agents.TDLearningPlayer(game.current_player, game, learner=learner)
+	assert learner.transitions
+	assert learner.updates == len(learner.transitions)
+	assert learner.episode is game
+	before = learner.weights.copy()
+	learner.replay(batch_size=2)
+	assert learner.updates == 2 * len(learner.transitions)
+	assert (learner.weights != before).any()
+
+
+def test_evaluators(monkeypatch):
+	game = _feature_game()
+	states = [(player, game) for player in game.players]
+	matrix = agents.featureMatrix(states)
+	linear = agents.LinearEvaluator()
+	assert linear.batch(matrix) == pytest.approx([agents.approximateV(player, game) for player in game.players])
+	assert linear.value(*states[0]) == pytest.approx(linear.batch(matrix)[0])
+	assert agents.LinearEvaluator({"bias": 2.}).batch(matrix) == [2., 2.]
+	# Plain dicts of weights count their changes too
+	fixed = agents.LinearEvaluator({"bias": 2.})
+	version = fixed.version
+	fixed.weights["bias"] = 3.
+	assert fixed.version != version
+	assert fixed.batch(matrix) == [3., 3.]
+
+	# Fit a network to the linear values of a few positions
+	random.seed(2)
+	rows = []
+	for i in range(8):
+		agents.faceFirstLegalMovePlayer(game.current_player, game)
+		rows += [agents.featureRow(player, game) for player in game.players]
+	targets = linear.batch(rows)
+	mlp = agents.MLPEvaluator(hidden=8, seed=1)
+	initial = numpy.mean((numpy.array(mlp.batch(rows)) - targets) ** 2)
+	assert mlp.fit(rows, targets, epochs=200, seed=1) < initial / 10
+	assert mlp.version == 1
+	assert mlp.batch([]) == []
+
+	# Every agent evaluates through the current evaluator
+	monkeypatch.setattr(agents, "evaluator", mlp)
+	player = game.current_player
+	assert agents.approximateV(player, game) == pytest.approx(mlp.batch([agents.featureRow(player, game)])[0])
+	generator = MoveGenerator(player)
+	values = agents.lookahead(generator)
+	assert values[-1] == pytest.approx(agents.approximateV(player, game))
+	player_index = game.players.index(player)
+	assert agents.alphabetaGetBestAction(player_index, game, 1)[1]
+
+	# Cached values are dropped along with the evaluator
+	cache = agents.ValueCache()
+	zobrist.start()
+	try:
+		cache.value(player, game)
+		monkeypatch.setattr(agents, "evaluator", linear)
+		assert cache.value(player, game) == agents.approximateV(player, game)
+		assert not cache.hits
+	finally:
+		zobrist.stop()
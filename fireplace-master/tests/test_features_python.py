@@ -0,0 +1,48 @@
+import pytest
+from utils import *
+from fireplace import utils as agents
+
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+	# The fallback path taken when NumPy is not installed
+	monkeypatch.setattr(agents, "numpy", None)
+
+
+def _feature_game():
+	game = prepare_game()
+	for player in game.players:
+		player.total_mana_spent = 0
+	game.player1.summon(WISP)
+	game.player2.summon("CS2_182")
+	return game
+
+
+def test_feature_row(no_numpy):
+	game = _feature_game()
+	for player in game.players:
+		row = agents.featureRow(player, game)
+		assert isinstance(row, list)
+		phi = agents.featureExtractor2(player, game)
+		assert row == [phi[x] for x in agents.FEATURES]
+	weights = agents.weightVector()
+	assert weights == [agents.premade_weights[x] for x in agents.FEATURES]
+
+
+def test_batch_evaluation(no_numpy):
+	game = _feature_game()
+	states = [(player, game) for player in game.players] * 2
+	matrix = agents.featureMatrix(states)
+	assert isinstance(matrix, list) and len(matrix) == 4
+	values = agents.batchApproximateStates(states)
+	for (player, game), value in zip(states, values):
+		assert value == pytest.approx(agents.approximateV(player, game))
+	assert agents.batchApproximateRows([]) == []
+	assert agents.LinearEvaluator({"bias": 2.}).batch(matrix) == [2.] * 4
+
+
+def test_numpy_only(no_numpy):
+	with pytest.raises(ImportError):
+		agents.MLPEvaluator()
+	with pytest.raises(ImportError):
+		agents.TDLearner()
@@ -0,0 +1,142 @@
+from utils import *
+from fireplace.utils import game_state_to_xml
+
+
+def _snapshot(game):
+	return (
+		game_state_to_xml(game),
+		[list(zone) for player in game.players for zone in (
+			player.hand, player.deck, player.field, player.graveyard, player.discarded
+		)],
+		[list(e.buffs) for e in game.characters],
+		list(game.active_aura_buffs),
+	)
+
+
+def test_rollback():
+	game = prepare_game()
+	wisp = game.player1.give(WISP)
+	wisp.play()
+	raidleader = game.player1.give("CS2_122")
+	game.end_turn()
+	game.end_turn()
+	before = _snapshot(game)
+	entity_id = game.manager.counter
+
+	mark = game.mark()
+	raidleader.play()
+	assert wisp.atk == 2
+	wisp.attack(game.player2.hero)
+	game.player1.give(MOONFIRE).play(target=raidleader)
+	game.player1.give(MOONFIRE).play(target=raidleader)
+	assert raidleader.dead
+	assert wisp.atk == 1
+	game.end_turn()
+	game.rollback(mark)
+
+	assert _snapshot(game) == before
+	assert game.manager.counter == entity_id
+	assert raidleader in game.player1.hand
+	assert wisp.atk == 1
+	assert wisp.can_attack()
+	assert game.player2.hero.health == 30
+	assert game.current_player is game.player1
+
+
+def test_rollback_nested():
+	game = prepare_game()
+	before = _snapshot(game)
+	mark = game.mark()
+	wisp = game.player1.give(WISP)
+	wisp.play()
+	game.end_turn()
+	game.end_turn()
+	after_wisp = _snapshot(game)
+
+	inner = game.mark()
+	wisp.attack(game.player2.hero)
+	game.player1.give(MOONFIRE).play(target=wisp)
+	assert wisp.dead
+	game.rollback(inner)
+	assert _snapshot(game) == after_wisp
+	assert wisp.can_attack()
+
+	inner = game.mark()
+	game.player1.give(MOONFIRE).play(target=game.player2.hero)
+	game.commit(inner)
+	assert game.player2.hero.health == 29
+
+	game.rollback(mark)
+	assert _snapshot(game) == before
+	assert not game.player1.field
+
+
+def test_rollback_choice():
+	game = prepare_game()
+	before = _snapshot(game)
+	mark = game.mark()
+	game.player1.give("DS1_184").play()
+	game.player1.choice.choose(game.player1.choice.cards[0])
+	game.rollback(mark)
+	assert _snapshot(game) == before
+	assert not game.player1.choice
+
+
+def test_value_of_move():
+	from fireplace.utils import approximateV, get_action_by_index, get_value_of_move
+	game = prepare_game()
+	player = game.current_player
+	index = game.players.index(player)
+	player.discard_hand()
+	for p in game.players:
+		p.total_mana_spent = 0
+	player.give(WISP)
+	player.give(MOONFIRE)
+	before = _snapshot(game)
+	value = get_value_of_move(game, 0, playerIndex=index)
+	assert _snapshot(game) == before
+	assert not player.field
+
+	clone = game.clone()
+	get_action_by_index(clone, 0, index)[1].play()
+	assert len(clone.players[index].field) == 1
+	assert value == approximateV(clone.players[index], clone)
+
+
+def test_snapshot_restore():
+	game = prepare_game()
+	wisp = game.player1.give(WISP)
+	moonfire = game.player1.give(MOONFIRE)
+	root = game.mark()
+	before = _snapshot(game)
+
+	mark = game.mark()
+	wisp.play()
+	played = game.snapshot(mark)
+	after_wisp = _snapshot(game)
+	game.rollback(mark)
+	assert _snapshot(game) == before
+
+	mark = game.mark()
+	game.restore(played)
+	assert _snapshot(game) == after_wisp
+	inner = game.mark()
+	moonfire.play(target=wisp)
+	both = game.snapshot(inner, played)
+	after_moonfire = _snapshot(game)
+	game.rollback(inner)
+	game.rollback(mark)
+	assert _snapshot(game) == before
+
+	# The wisp's state is shared rather than copied
+	assert both.parent is played
+	assert played.changes
+
+	mark = game.mark()
+	game.restore(both)
+	assert _snapshot(game) == after_moonfire
+	assert wisp.dead
+	game.rollback(mark)
+	game.rollback(root)
+	assert _snapshot(game) == before
+	assert wisp in game.player1.hand
@@ -0,0 +1,223 @@
+from utils import *
+from fireplace import lethal
+from fireplace.moves import apply_move
+
+
+FIREBALL = "CS2_029"
+ARCANE_MISSILES = "EX1_277"
+BLUEGILL_WARRIOR = "CS2_173"
+FLAME_IMP = "EX1_319"
+SENJIN_SHIELDMASTA = "CS2_179"
+ABUSIVE_SERGEANT = "CS2_188"
+
+
+def _lethal_game():
+	game = prepare_empty_game(CardClass.MAGE, CardClass.MAGE)
+	for player in game.players:
+		player.discard_hand()
+	return game
+
+
+def test_damage_bound():
+	game = _lethal_game()
+	player = game.current_player
+	player.max_mana = 10
+	# Asleep minions cannot attack
+	player.summon(WISP)
+	assert lethal.damage_bound(player) == 1
+	game.end_turn()
+	game.end_turn()
+	# Wisp and Fireblast
+	player.max_mana = 10
+	assert lethal.damage_bound(player) == 2
+	player.give(BLUEGILL_WARRIOR)
+	assert lethal.damage_bound(player) == 2 + 2
+	player.give(FIREBALL)
+	assert lethal.damage_bound(player) == 2 + 2 + 6
+	# Flame Imp only hits its own hero
+	player.give(FLAME_IMP)
+	assert lethal.damage_bound(player) == 2 + 2 + 6
+	player.give(MOONFIRE)
+	assert lethal.damage_bound(player) == 2 + 2 + 6 + 1
+
+	# Not enough mana for everything: Fireball, Bluegill and Moonfire
+	player.used_mana = 4
+	assert lethal.damage_bound(player) == 1 + 6 + 2 + 1
+	player.used_mana = 0
+
+	# Frozen characters do not attack
+	player.field[0].frozen = True
+	assert lethal.damage_bound(player) == 2 + 2 + 6 + 1 - 1
+
+	# Scripts which cannot be read
+	player.give(ARCANE_MISSILES)
+	assert lethal.damage_bound(player) == lethal.INFINITY
+
+
+def test_damage_bound_uncounted():
+	game = _lethal_game()
+	player = game.current_player
+	player.summon(WISP)
+	game.end_turn()
+	game.end_turn()
+	player.opponent.hero.set_current_health(3)
+	player.used_mana = player.max_mana - 1
+	assert lethal.damage_bound(player) == 1
+	# Sergeant on the Wisp, then the Wisp face is lethal
+	player.give(ABUSIVE_SERGEANT)
+	assert lethal.damage_bound(player) == lethal.INFINITY
+	# Spell damage
+	player.hand[0].discard()
+	player.used_mana = player.max_mana - 2
+	player.give(KOBOLD_GEOMANCER)
+	assert lethal.damage_bound(player) == lethal.INFINITY
+	# Triggered effects on the board
+	player.hand[0].discard()
+	player.summon("NEW1_019")
+	assert lethal.damage_bound(player) == lethal.INFINITY
+	# Abomination hits the enemy hero when it dies
+	player.field[-1].destroy()
+	game.process_deaths()
+	# Wisp and Fireblast
+	assert lethal.damage_bound(player) == 1 + 1
+	player.opponent.summon("EX1_097")
+	assert lethal.damage_bound(player) == lethal.INFINITY
+
+
+def test_damage_bound_coin():
+	game = _lethal_game()
+	player = game.current_player
+	player.opponent.hero.set_current_health(6)
+	player.used_mana = player.max_mana - 3
+	player.give(FIREBALL)
+	# Fireblast
+	assert lethal.damage_bound(player) == 1
+	# The Coin makes the Fireball playable
+	player.give(THE_COIN)
+	assert lethal.damage_bound(player) == 6
+
+
+def test_damage_bound_taunts():
+	game = _lethal_game()
+	player = game.current_player
+	for i in range(2):
+		player.summon(WISP)
+	player.summon(TARGET_DUMMY)
+	player.opponent.summon(SENJIN_SHIELDMASTA)
+	game.end_turn()
+	game.end_turn()
+	player.used_mana = player.max_mana
+	# The taunt takes one of the attacks
+	assert lethal.damage_bound(player) == 1
+	assert not lethal.trivial_lethal(player)
+
+
+def test_trivial_lethal():
+	game = _lethal_game()
+	player = game.current_player
+	for i in range(3):
+		player.summon(WISP)
+	game.end_turn()
+	game.end_turn()
+	opponent = player.opponent.hero
+	opponent.set_current_health(3)
+	assert lethal.trivial_lethal(player)
+	opponent.armor = 1
+	assert not lethal.trivial_lethal(player)
+	assert lethal.damage_bound(player) >= 4
+
+
+def _solver_game(health):
+	game = _lethal_game()
+	player = game.current_player
+	for i in range(2):
+		player.summon(WISP)
+	player.opponent.summon(GOLDSHIRE_FOOTMAN)
+	game.end_turn()
+	game.end_turn()
+	player.opponent.hero.set_current_health(health)
+	return game, player
+
+
+def test_lethal_solver():
+	from fireplace.utils import LethalSolver, game_state_to_xml
+	game, player = _solver_game(2)
+	player.used_mana = player.max_mana - 2
+	player.give(MOONFIRE)
+	before = game_state_to_xml(game)
+	solver = LethalSolver()
+	line = solver.solve(player)
+	assert game_state_to_xml(game) == before
+	assert len(line) >= 2
+	# Not enough budget to find it
+	assert LethalSolver(max_nodes=1).solve(player) is None
+	for move in line:
+		apply_move(player, move)
+	assert player.playstate == PlayState.WON
+
+	# The Footman takes either both spells or one of the Wisps
+	game, player = _solver_game(3)
+	player.used_mana = player.max_mana - 2
+	player.give(MOONFIRE)
+	solver = LethalSolver()
+	assert solver.solve(player) is None
+	assert solver.nodes and solver.hits
+	# Out of reach without simulating anything
+	game, player = _solver_game(3)
+	player.used_mana = player.max_mana
+	solver = LethalSolver()
+	assert solver.solve(player) is None
+	assert solver.pruned and not solver.nodes
+
+
+def test_lethal_solver_random():
+	from fireplace.utils import LethalSolver, mctsPlayer
+	game = _lethal_game()
+	player = game.current_player
+	player.opponent.hero.set_current_health(3)
+	player.opponent.summon(WISP)
+	player.used_mana = player.max_mana - 1
+	player.give(ARCANE_MISSILES)
+	# The Wisp can take a missile
+	assert LethalSolver().solve(player) is None
+	player.opponent.field[0].destroy()
+	line = LethalSolver().solve(player)
+	assert len(line) == 1
+
+	mctsPlayer(player, game, iterations=1, lethal=LethalSolver())
+	assert player.playstate == PlayState.WON
+
+
+def test_lethal_solver_buff(monkeypatch):
+	from fireplace import utils as agents
+	game = _lethal_game()
+	player = game.current_player
+	player.summon(WISP)
+	game.end_turn()
+	game.end_turn()
+	player.opponent.hero.set_current_health(3)
+	player.used_mana = player.max_mana - 1
+	player.give(ABUSIVE_SERGEANT)
+	# The agents' move filters do not hide moves from the solver
+	monkeypatch.setattr(agents, "attack_planning", 1)
+	monkeypatch.setattr(agents, "turn_planning", 1)
+	line = agents.LethalSolver(max_nodes=1000).solve(player)
+	assert len(line) == 2
+	for move in line:
+		apply_move(player, move)
+	assert player.playstate == PlayState.WON
+
+
+def test_lethal_solver_coin():
+	from fireplace.utils import LethalSolver
+	game = _lethal_game()
+	player = game.current_player
+	player.opponent.hero.set_current_health(6)
+	player.used_mana = player.max_mana - 3
+	player.give(FIREBALL)
+	player.give(THE_COIN)
+	line = LethalSolver(max_nodes=1000).solve(player)
+	assert len(line) == 2
+	for move in line:
+		apply_move(player, move)
+	assert player.playstate == PlayState.WON
@@ -0,0 +1,104 @@
+import pytest
+from utils import *
+from fireplace.exceptions import InvalidAction
+from fireplace.moves import END_TURN, Move, MoveGenerator, apply_move, resolve
+
+
+def test_move_generator():
+	game = prepare_game()
+	game.player1.discard_hand()
+	wisp = game.player1.give(WISP)
+	moonfire = game.player1.give(MOONFIRE)
+	enemy = game.player2.summon(WISP)
+	generator = MoveGenerator(game.player1)
+	targets = [character.entity_id for character in moonfire.targets]
+	assert generator.moves[:len(targets) + 1] == (
+		[Move("CARD", wisp.entity_id, None, None)] +
+		[Move("CARD", moonfire.entity_id, None, target) for target in targets]
+	)
+	assert generator.moves[-1] == END_TURN
+	assert generator.sources[:2] == [(wisp, []), (moonfire, moonfire.targets)]
+	assert generator.sources[2][0] is game.player1.hero.power
+
+	# Moves keep their ids in clones and after other moves
+	move = Move("CARD", moonfire.entity_id, None, enemy.entity_id)
+	assert move in generator
+	clone = game.clone()
+	assert not apply_move(clone.player1, move)
+	assert not clone.player2.field
+	assert enemy in game.player2.field
+	assert not generator.apply(Move("CARD", wisp.entity_id, None, None))
+	assert not generator.apply(move)
+	assert not game.player2.field
+	assert game.player1.field == [wisp]
+	assert generator.apply(END_TURN)
+	assert game.current_player is game.player2
+
+	# The moonfire was played
+	with pytest.raises(InvalidAction):
+		resolve(game.player1, move)
+
+
+def test_move_generator_choose_one():
+	game = prepare_game()
+	game.player1.discard_hand()
+	wrath = game.player1.give("EX1_154")
+	wisp = game.player2.summon(WISP)
+	game.player1.max_mana = 10
+	moves = [move for move in MoveGenerator(game.player1) if move.source == wrath.entity_id]
+	assert {move.choose for move in moves} == {card.entity_id for card in wrath.choose_cards}
+	assert {move.target for move in moves} == {wisp.entity_id}
+	apply_move(game.player1, moves[0])
+	assert wisp.dead
+	assert wrath not in game.player1.hand
+
+
+def test_move_generator_sources_same_id():
+	game = prepare_game()
+	game.player1.discard_hand()
+	wrath = game.player1.give("EX1_154")
+	wisp1 = game.player2.summon(WISP)
+	wisp2 = game.player2.summon(WISP)
+	generator = MoveGenerator(game.player1, unique=False)
+	for card, targets in generator.sources:
+		if card.entity_id == wrath.entity_id:
+			break
+	assert [target.entity_id for target in targets] == [target.entity_id for target in wrath.targets]
+	assert {wisp1.entity_id, wisp2.entity_id} <= {target.entity_id for target in targets}
+
+
+def test_move_generator_unique():
+	game = prepare_game()
+	game.player1.discard_hand()
+	wisp1 = game.player1.give(WISP)
+	wisp2 = game.player1.give(WISP)
+	moonfire = game.player1.give(MOONFIRE)
+	enemy1 = game.player2.summon(WISP)
+	enemy2 = game.player2.summon(WISP)
+	enemy3 = game.player2.summon(WISP)
+	enemy3.buff(enemy3, "CS2_122e")
+
+	generator = MoveGenerator(game.player1, unique=True)
+	sources = [source.entity_id for source, targets in generator.sources]
+	assert wisp1.entity_id in sources and wisp2.entity_id not in sources
+	targets = [target.entity_id for target in dict(generator.sources)[moonfire]]
+	# Minions in play are told apart by their positions
+	assert enemy1.entity_id in targets and enemy2.entity_id in targets
+	assert enemy3.entity_id in targets
+	assert len(generator) < len(MoveGenerator(game.player1))
+
+
+def test_move_generator_unique_positions():
+	game = prepare_game(CardClass.HUNTER, CardClass.HUNTER)
+	game.player1.discard_hand()
+	shot = game.player1.give("EX1_537")
+	wisp1 = game.player2.summon(WISP)
+	wisp2 = game.player2.summon(WISP)
+	yeti = game.player2.summon("CS2_182")
+	generator = MoveGenerator(game.player1, unique=True)
+	targets = [target.entity_id for target in dict(generator.sources)[shot]]
+	# Shooting the second Wisp also hits the Yeti
+	assert wisp1.entity_id in targets and wisp2.entity_id in targets
+	move = [move for move in generator if move.source == shot.entity_id and move.target == wisp2.entity_id][0]
+	generator.apply(move)
+	assert yeti.damage == 2
@@ -0,0 +1,499 @@
+import pytest
+import time
+from utils import *
+from fireplace import journal, utils as agents
+from fireplace.moves import Move, MoveGenerator, apply_move
+from fireplace.utils import game_state_to_xml
+
+
+def _prepare_search_game(seed, turns=6):
+	random.seed(seed)
+	game = agents.setup_game()
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.choice.choose()
+	for i in range(turns):
+		agents.faceFirstLegalMovePlayer(game.current_player, game)
+	if game.current_player is not game.players[0]:
+		agents.faceFirstLegalMovePlayer(game.current_player, game)
+	return game
+
+
+def test_minimax_persistent():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	random.seed(99)
+	expected = agents.minimaxGetBestAction(0, game, 1, "")
+	random.seed(99)
+	assert agents.minimaxGetBestAction(0, game, 1, "", persistent=True) == expected
+	assert game_state_to_xml(game) == before
+	assert expected[1]
+
+
+def test_state_hash():
+	from fireplace import zobrist
+	game = prepare_game()
+	wisp1 = game.player1.give(WISP)
+	wisp1.play()
+	wisp2 = game.player1.give(WISP)
+	wisp2.play()
+	game.end_turn()
+	game.end_turn()
+
+	zobrist.start()
+	try:
+		before = game.state_hash()
+		assert before == zobrist.compute(game)
+		mark = game.mark()
+		wisp1.attack(game.player2.hero)
+		assert game.state_hash() != before
+		wisp2.attack(game.player2.hero)
+		after = game.state_hash()
+		assert after == zobrist.compute(game)
+		game.rollback(mark)
+		assert game.state_hash() == before
+
+		# The same attacks in the other order reach the same state
+		clone = game.clone()
+		assert clone.state_hash() == before
+		clone.player1.field[1].attack(clone.player2.hero)
+		clone.player1.field[0].attack(clone.player2.hero)
+		assert clone.state_hash() == after
+		assert game.state_hash() == before
+
+		# The same minions in other positions are another state
+		clone = game.clone()
+		field = clone.player1.field
+		field[0], field[1] = field[1], field[0]
+		assert clone.state_hash() != before
+		assert clone.state_hash() == zobrist.compute(clone)
+	finally:
+		zobrist.stop()
+
+
+def test_transposition_table():
+	from fireplace.zobrist import TranspositionTable
+	table = TranspositionTable(3)
+	assert table.size == 4
+	table.store(1, 2, "deep")
+	assert table.lookup(1, 2) == "deep"
+	assert table.lookup(1, 1) is None
+	assert table.lookup(2, 2) is None
+	# Shallower results do not replace deeper ones from the same search...
+	table.store(5, 1, "shallow")
+	assert table.lookup(5, 1) is None
+	assert table.lookup(1, 2) == "deep"
+	# ...but do replace those from an older search
+	table.new_search()
+	table.store(5, 1, "shallow")
+	assert table.lookup(5, 1) == "shallow"
+	assert table.stats == {
+		"hits": 3, "misses": 3, "stores": 2, "replacements": 1, "rejections": 1, "entries": 1,
+	}
+
+
+def test_minimax_transposition_table():
+	from fireplace.zobrist import TranspositionTable
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	table = TranspositionTable()
+	random.seed(99)
+	expected = agents.minimaxGetBestAction(0, game, 1, "", table=table)
+	assert table.stores
+	assert game_state_to_xml(game) == before
+	random.seed(99)
+	table = TranspositionTable()
+	assert agents.minimaxGetBestAction(0, game, 1, "", True, table) == expected
+	assert game_state_to_xml(game) == before
+	hits = table.hits
+	assert agents.minimaxGetBestAction(0, game, 1, "", True, table) == expected
+	assert table.hits == hits + 1
+
+
+def test_minimax_frontier_pool():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	results = []
+	for pool in (agents.FrontierPool(1), agents.FrontierPool(2, chunksize=1, min_frontier=1)):
+		random.seed(99)
+		results.append((agents.minimaxGetBestAction(0, game, 1, "", pool=pool), random.random()))
+		assert game_state_to_xml(game) == before
+	assert results[0] == results[1]
+	assert results[0][0][1]
+
+
+def test_mcts():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	value, move = agents.mctsGetBestAction(0, game, iterations=20, rollout_turns=2, evaluate_leaves=True)
+	assert 0 <= value <= 1
+	assert move in MoveGenerator(game.players[0])
+	assert game_state_to_xml(game) == before
+
+	player = game.players[0]
+	agents.mctsPlayer(player, game, iterations=5, rollout_turns=1)
+	assert game.ended or game.current_player is not player
+
+
+def test_mcts_failed_move(monkeypatch):
+	from fireplace.exceptions import InvalidAction
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	root = agents._MCTSNode(None)
+
+	def apply(self, move):
+		raise InvalidAction()
+
+	with monkeypatch.context() as m:
+		m.setattr(MoveGenerator, "apply", apply)
+		with pytest.raises(InvalidAction):
+			agents._mcts_iteration(root, game, 0, 1., 1, False, 10.)
+	# No child is left unvisited
+	assert not root.children
+	assert game_state_to_xml(game) == before
+	value, move = agents.mctsGetBestAction(0, game, iterations=10, rollout_turns=1, root=root)
+	assert all(child.visits for child in root.children.values())
+
+
+def test_iterative_deepening():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	for persistent in (False, True):
+		random.seed(99)
+		budget = agents.SearchBudget(max_nodes=10)
+		value, actions, depth = agents.minimaxIterativeDeepening(0, game, budget, persistent=persistent)
+		assert depth == 0
+		assert actions
+		assert game_state_to_xml(game) == before
+
+	budget = agents.SearchBudget(max_nodes=100000)
+	value, actions, depth = agents.minimaxIterativeDeepening(0, game, budget, max_depth=1)
+	assert depth == 1
+	assert budget.nodes > 10
+	assert game_state_to_xml(game) == before
+
+	budget = agents.SearchBudget(deadline=time.time() + 0.5)
+	value, actions, depth = agents.minimaxIterativeDeepening(0, game, budget, persistent=True)
+	assert actions
+	assert game_state_to_xml(game) == before
+	assert not journal.active
+
+
+def test_iterative_deepening_pool():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	budget = agents.SearchBudget(max_nodes=50)
+	pool = agents.FrontierPool(1)
+	value, actions, depth = agents.minimaxIterativeDeepening(0, game, budget, pool=pool)
+	assert depth == 0
+	assert game_state_to_xml(game) == before
+
+
+def test_alphabeta():
+	from fireplace.zobrist import TranspositionTable
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	random.seed(99)
+	search = agents.AlphaBetaSearch()
+	value, actions = search.search(0, game, 1)
+	assert game_state_to_xml(game) == before
+	assert actions
+	assert search.cutoffs
+	assert search.killers and search.history
+
+	# Transposed action orders are looked up instead of searched again
+	random.seed(99)
+	table = TranspositionTable()
+	assert agents.alphabetaGetBestAction(0, game, 1, table) == (value, actions)
+	assert table.hits
+	assert game_state_to_xml(game) == before
+	assert not journal.active
+
+
+def test_alphabeta_budget():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	budget = agents.SearchBudget(max_nodes=200)
+	value, actions, depth = agents.minimaxIterativeDeepening(0, game, budget, alphabeta=True)
+	assert actions
+	assert game_state_to_xml(game) == before
+	assert not journal.active
+
+
+def _quiet_game():
+	game = prepare_game(CardClass.WARRIOR, CardClass.WARRIOR)
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.discard_hand()
+	for i in range(2):
+		game.player1.summon("CS2_182")
+	game.end_turn()
+	game.end_turn()
+	for player in game.players:
+		player.discard_hand()
+		for card in player.deck[:]:
+			card.discard()
+	game.player1.give("CS2_120")
+	game.player1.give("CS2_120")
+	game.player2.give("CS2_182")
+	return game
+
+
+def test_commuting_moves(monkeypatch):
+	game = _quiet_game()
+	before = game_state_to_xml(game)
+	player = game.player1
+	assert agents._quiet_board(game)
+	generator = MoveGenerator(player)
+	for move in generator:
+		source, choose, target = generator.entities[move]
+		key = agents._commuting_key(player, move, source, target, True)
+		if move.type == "CARD" or (move.type == "ATTACK" and target is player.opponent.hero):
+			assert key == source.entity_id
+		else:
+			assert key is None
+
+	# Same value, fewer nodes
+	random.seed(1)
+	search = agents.AlphaBetaSearch(futility_margin=None)
+	value, actions = search.search(0, game, 1)
+	assert game_state_to_xml(game) == before
+	monkeypatch.setattr(agents, "_commuting_key", lambda *args: None)
+	random.seed(1)
+	unpruned = agents.AlphaBetaSearch(futility_margin=None)
+	assert unpruned.search(0, game, 1)[0] == value
+	assert search.nodes < unpruned.nodes
+
+	# Auras can make the order of moves matter
+	game.player2.summon("CS2_122")
+	assert not agents._quiet_board(game)
+
+
+def test_commuting_positional():
+	game = prepare_empty_game(CardClass.WARRIOR, CardClass.WARRIOR)
+	player = game.current_player
+	player.discard_hand()
+	player.give("CS2_172")
+	player.give("CS2_182")
+	assert agents._quiet_board(game)
+	# Defender of Argus buffs the minions next to it, so play order matters
+	player.give("EX1_093")
+	assert not agents._quiet_board(game)
+
+
+def test_unique_moves(monkeypatch):
+	game = prepare_empty_game(CardClass.WARRIOR, CardClass.WARRIOR)
+	for player in game.players:
+		player.total_mana_spent = 0
+		player.discard_hand()
+	player = game.current_player
+	player_index = game.players.index(player)
+	for i in range(2):
+		player.give(WISP)
+	player.give(MOONFIRE)
+	player.opponent.summon(WISP)
+	before = game_state_to_xml(game)
+	random.seed(1)
+	search = agents.AlphaBetaSearch(futility_margin=None)
+	value, actions = search.search(player_index, game, 1)
+	assert game_state_to_xml(game) == before
+	monkeypatch.setattr(agents, "unique_moves", False)
+	random.seed(1)
+	full = agents.AlphaBetaSearch(futility_margin=None)
+	assert full.search(player_index, game, 1)[0] == value
+	assert search.nodes < full.nodes
+
+
+def test_minimax_lazy():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	random.seed(99)
+	expected = agents.minimaxGetBestAction(0, game, 1, "", pool=agents.FrontierPool(1))
+	random.seed(99)
+	assert agents.minimaxGetBestAction(0, game, 1, "", lazy=True) == expected
+	assert game_state_to_xml(game) == before
+
+	# A bound on the number of chains only matters once it is hit
+	random.seed(99)
+	assert agents.minimaxGetBestAction(0, game, 1, "", lazy=True, max_chains=10 ** 6) == expected
+	random.seed(99)
+	value, actions = agents.minimaxGetBestAction(0, game, 1, "", lazy=True, max_chains=2)
+	assert actions
+	assert game_state_to_xml(game) == before
+
+
+def test_completed_chains():
+	chains = []
+	for value in (3, 1, 2, 1, 5, 0):
+		agents._add_completed_chain(chains, (value, len(chains)), 0)
+	assert [chain[0] for chain in chains] == [0, 1, 1]
+	chains = []
+	for i, value in enumerate((3, 1, 5, 3, 0)):
+		agents._add_completed_chain(chains, (value, i), 1)
+	assert chains == [(5, 2), (3, 3), (3, 0)]
+	assert agents._cap_chains([(1, ), (3, ), (2, ), (0, )], 2, 0) == [(3, ), (2, )]
+	assert agents._cap_chains([(1, ), (3, ), (2, ), (0, )], 2, 1) == [(1, ), (0, )]
+
+
+def test_lookahead():
+	game = _prepare_search_game(1)
+	before = game_state_to_xml(game)
+	player = game.players[0]
+	generator = MoveGenerator(player)
+	random.seed(99)
+	values = agents.lookahead(generator)
+	after = random.random()
+	assert game_state_to_xml(game) == before
+	assert len(values) == len(generator)
+	# Ending the turn leaves the state as it is
+	assert values[-1] == pytest.approx(agents.approximateV(player, game))
+
+	# The same values on worker processes
+	random.seed(99)
+	pool = agents.LookaheadPool(2, chunksize=1, min_moves=1)
+	assert agents.lookahead(generator, pool=pool) == values
+	assert random.random() == after
+	assert game_state_to_xml(game) == before
+
+	agents.TDLearningPlayer(player, game, pool)
+	assert game.ended or game.current_player is not player
+
+
+def test_ponderer():
+	game = _quiet_game()
+	player = game.player1
+	player_index = game.players.index(player)
+	game.end_turn()
+	before = game_state_to_xml(game)
+	ponderer = agents.Ponderer(max_iterations=30, rollout_turns=1)
+	ponderer.start(game, player_index)
+	assert ponderer.pondering
+	time.sleep(1)
+	assert game_state_to_xml(game) == before
+	agents.faceFirstLegalMovePlayer(game.current_player, game)
+	assert game.current_player is player
+	node = ponderer.stop(game)
+	assert not ponderer.pondering
+	assert 0 < ponderer.iterations <= 30
+	assert node is not None and node.visits
+	visits = node.visits
+
+	# The search carries on from the node's statistics
+	value, move = agents.mctsGetBestAction(player_index, game, iterations=5, rollout_turns=1, root=node)
+	assert node.visits == visits + 5
+	assert move in MoveGenerator(player)
+	agents.mctsPlayer(player, game, iterations=5, rollout_turns=1, ponderer=ponderer)
+	assert ponderer.pondering
+	ponderer.stop(game)
+
+
+def test_attack_plans(monkeypatch):
+	game = _quiet_game()
+	player = game.player1
+	player.summon(WISP)
+	game.end_turn()
+	game.end_turn()
+	player.discard_hand()
+	squire = player.opponent.summon("EX1_008")
+	senjin = player.opponent.summon("CS2_179")
+	before = game_state_to_xml(game)
+	plans = agents.attack_plans(player, 3)
+	assert game_state_to_xml(game) == before
+	assert len(plans) == 3
+	assert [value for value, moves in plans] == sorted((value for value, moves in plans), reverse=True)
+	for value, moves in plans:
+		targets = [move.target for move in moves]
+		if any(target != senjin.entity_id for target in targets):
+			# The taunt goes first, and takes both Yetis
+			assert targets[:2] == [senjin.entity_id] * 2
+		mark = game.mark()
+		for move in moves:
+			apply_move(player, move)
+		if targets.count(squire.entity_id) == 1:
+			# Divine Shield
+			assert squire.zone == Zone.PLAY
+		game.rollback(mark)
+
+	# The agents only consider the first attack of each plan
+	starts = {moves[0] for value, moves in plans if moves}
+	monkeypatch.setattr(agents, "attack_planning", 3)
+	generator = agents._move_generator(player)
+	attacks = {move for move in generator if move.type == "ATTACK"}
+	assert attacks and attacks <= starts
+	player_index = game.players.index(player)
+	random.seed(1)
+	search = agents.AlphaBetaSearch(futility_margin=None)
+	value, actions = search.search(player_index, game, 1)
+	assert actions
+	assert game_state_to_xml(game) == before
+	monkeypatch.setattr(agents, "attack_planning", None)
+	random.seed(1)
+	full = agents.AlphaBetaSearch(futility_margin=None)
+	full.search(player_index, game, 1)
+	assert search.nodes < full.nodes
+
+
+def test_attack_plans_evaluator(monkeypatch):
+	class MinionsLost(agents.Evaluator):
+		# Losing minions is good: not a bound a linear model would give
+		def batch(self, matrix):
+			return [-3 * row[4] + .1 * row[6] for row in matrix]
+
+	game = prepare_empty_game(CardClass.WARRIOR, CardClass.WARRIOR)
+	player = game.current_player
+	for i in range(2):
+		player.summon(WISP)
+		player.opponent.summon("CS2_182")
+	game.end_turn()
+	game.end_turn()
+	for p in game.players:
+		p.total_mana_spent = 0
+	monkeypatch.setattr(agents, "evaluator", MinionsLost())
+	# Both Wisps die into the Yetis
+	value, moves = agents.attack_plans(player, 1)[0]
+	assert value == pytest.approx(6)
+	assert len(moves) == 2
+
+
+def test_turn_plans(monkeypatch):
+	assert agents._pareto_spends([(2, 1., "a"), (2, 1.5, "b"), (4, 2., "c"), (0, -.5, "d")], 4) == [
+		(0, 0., []), (2, 1.5, ["b"]), (4, 2.5, ["a", "b"]),
+	]
+	game = _quiet_game()
+	player = game.player1
+	player.give("CS2_182")
+	player.give(MOONFIRE)
+	player.used_mana = player.max_mana - 4
+	before = game_state_to_xml(game)
+	plans = agents.turn_plans(player, 3)
+	assert game_state_to_xml(game) == before
+	assert [value for value, moves in plans] == sorted((value for value, moves in plans), reverse=True)
+	assert (0., []) in plans
+	for value, moves in plans:
+		sources = [move.source for move in moves]
+		assert len(set(sources)) == len(sources)
+		mark = game.mark()
+		for move in moves:
+			apply_move(player, move)
+		assert player.mana >= 0
+		game.rollback(mark)
+	# The Yeti is worth more than both Crocolisks
+	yeti = [card for card in player.hand if card.id == "CS2_182"][0]
+	assert plans[0][1] == [Move("CARD", yeti.entity_id, None, None)]
+
+	# The agents only consider the cards of the plans
+	planned = {move for value, moves in plans for move in moves}
+	monkeypatch.setattr(agents, "turn_planning", 3)
+	generator = agents._move_generator(player)
+	assert {move for move in generator if move.type in ("CARD", "HEROPOWER")} <= planned
+	player_index = game.players.index(player)
+	random.seed(1)
+	search = agents.AlphaBetaSearch(futility_margin=None)
+	value, actions = search.search(player_index, game, 1)
+	assert actions
+	assert game_state_to_xml(game) == before
+	monkeypatch.setattr(agents, "turn_planning", None)
+	random.seed(1)
+	full = agents.AlphaBetaSearch(futility_margin=None)
+	assert full.search(player_index, game, 1)[0] == value
+	assert search.nodes < full.nodes